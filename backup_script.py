@@ -1,96 +1,287 @@
 #!/usr/bin/env python3
 """
 PiShock Project Backup Script
-Creates timestamped backups of the PiShock project files.
+Creates incremental, content-addressed backups of the PiShock project files.
+
+Each snapshot is a manifest (path -> content hash) in backups/manifests/.
+File contents are stored once per unique hash in backups/objects/, so files
+that did not change are never stored again.
 """
 
 import os
-import shutil
+import sys
+import json
+import zlib
+import hashlib
+import argparse
+import time
+import tempfile
 import datetime
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def create_backup():
-    """Create a timestamped backup of the PiShock project."""
-    
+# Project files worth backing up (build artifacts and backups are skipped)
+BACKUP_PATTERNS = ["*.py", "*.md", "*.txt", "*.sh", "*.bat", "*.spec", "LICENCE", "LICENSE",
+                   ".github/**/*.yml"]
+EXCLUDED_DIRS = {"backups", "build", "dist", "__pycache__", ".git"}
+
+CHUNK_SIZE = 1024 * 1024
+OBJECT_NAME_LENGTH = 64  # hex SHA-256; anything else in objects/ is a temp file
+# Prune leaves objects stored or reused this recently alone, since a backup
+# running at the same time may not have written the manifest that needs them
+PRUNE_GRACE_SECONDS = 3600
+
+def get_backup_dir():
+    """Return the backup directory for the current project."""
+    return Path.cwd() / "backups"
+
+def find_project_files(project_root):
+    """Return the project files to back up, relative to project_root."""
+    files = set()
+    for pattern in BACKUP_PATTERNS:
+        for path in project_root.glob(pattern):
+            relative = path.relative_to(project_root)
+            if path.is_file() and not EXCLUDED_DIRS.intersection(relative.parts):
+                files.add(relative)
+    return sorted(files)
+
+def object_path(backup_dir, digest):
+    """Return where a content object with the given hash is stored."""
+    return backup_dir / "objects" / digest[:2] / digest
+
+def store_file(source_file, backup_dir):
+    """Hash a file and store its compressed content if it is new.
+
+    Returns (digest, size, stored) where stored is False for deduplicated files.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(source_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            size += len(chunk)
+    digest = hasher.hexdigest()
+
+    target = object_path(backup_dir, digest)
+    try:
+        # Touch the reused object so a concurrent prune sees it as in use
+        os.utime(target)
+        return digest, size, False
+    except FileNotFoundError:
+        pass
+
+    # Stream the file through the compressor into a temp file, then publish it atomically.
+    # Each writer gets its own temp file, since identical files may be stored concurrently.
+    target.parent.mkdir(parents=True, exist_ok=True)
+    compressor = zlib.compressobj(9)
+    with open(source_file, 'rb') as src, \
+            tempfile.NamedTemporaryFile(dir=target.parent, prefix=f"{digest}.", suffix=".tmp", delete=False) as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            dst.write(compressor.compress(chunk))
+        dst.write(compressor.flush())
+    os.replace(dst.name, target)
+    return digest, size, True
+
+def read_object(backup_dir, digest):
+    """Yield the decompressed content of a stored object in chunks."""
+    decompressor = zlib.decompressobj()
+    with open(object_path(backup_dir, digest), 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+def load_manifest(backup_dir, name):
+    """Load a snapshot manifest by name (with or without .json)."""
+    manifest_path = backup_dir / "manifests" / f"{name.removesuffix('.json')}.json"
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def list_manifests(backup_dir):
+    """Return snapshot manifest paths, oldest first."""
+    return sorted((backup_dir / "manifests").glob("pishock_backup_*.json"))
+
+def create_backup(make_zip=False):
+    """Create an incremental, content-addressed backup of the PiShock project."""
+
     # Get the current directory (project root)
     project_root = Path.cwd()
-    backup_dir = project_root / "backups"
-    
-    # Create backup directory if it doesn't exist
-    backup_dir.mkdir(exist_ok=True)
-    
+    backup_dir = get_backup_dir()
+    (backup_dir / "manifests").mkdir(parents=True, exist_ok=True)
+
     # Generate timestamp for backup name
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_name = f"pishock_backup_{timestamp}"
-    backup_path = backup_dir / backup_name
-    
-    # Files to backup (excluding backup folder and build artifacts)
-    files_to_backup = [
-        "pishock_app.py",
-        "trigger.py", 
-        "README.md",
-        "LICENCE",
-        "pishock_app.spec"
-    ]
-    
-    # Create backup directory
-    backup_path.mkdir(exist_ok=True)
-    
+    manifest_path = backup_dir / "manifests" / f"{backup_name}.json"
+
     print(f"Creating backup: {backup_name}")
-    print(f"Backup location: {backup_path}")
-    
-    # Copy files to backup directory
-    backed_up_files = []
-    for file_name in files_to_backup:
-        source_file = project_root / file_name
-        if source_file.exists():
-            dest_file = backup_path / file_name
-            shutil.copy2(source_file, dest_file)
-            backed_up_files.append(file_name)
+
+    files_to_backup = find_project_files(project_root)
+
+    # Hashing and zlib both release the GIL, so independent files compress in parallel
+    with ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 2)) as executor:
+        results = list(executor.map(lambda f: store_file(project_root / f, backup_dir), files_to_backup))
+
+    manifest = {"name": backup_name, "created": timestamp, "files": {}}
+    new_files = 0
+    for file_name, (digest, size, stored) in zip(files_to_backup, results):
+        manifest["files"][file_name.as_posix()] = {"sha256": digest, "size": size}
+        if stored:
+            new_files += 1
             print(f"  ✓ Backed up: {file_name}")
         else:
-            print(f"  ⚠ File not found: {file_name}")
-    
-    # Create a zip archive of the backup
-    zip_path = backup_dir / f"{backup_name}.zip"
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file_name in backed_up_files:
-            file_path = backup_path / file_name
-            zipf.write(file_path, file_name)
-    
+            print(f"  = Unchanged: {file_name}")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    zip_path = export_zip(backup_dir, backup_name) if make_zip else None
+
     print(f"\nBackup completed successfully!")
-    print(f"Files backed up: {len(backed_up_files)}")
-    print(f"Backup folder: {backup_path}")
-    print(f"Zip archive: {zip_path}")
-    
-    return backup_path, zip_path
+    print(f"Files backed up: {len(files_to_backup)} ({new_files} new, "
+          f"{len(files_to_backup) - new_files} deduplicated)")
+    print(f"Manifest: {manifest_path}")
+    if zip_path:
+        print(f"Zip archive: {zip_path}")
+
+    return manifest_path, zip_path
+
+def export_zip(backup_dir, name):
+    """Stream a snapshot straight from the object store into a zip archive."""
+    manifest = load_manifest(backup_dir, name)
+    zip_path = backup_dir / f"{manifest['name']}.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file_name, entry in manifest["files"].items():
+            with zipf.open(file_name, 'w') as dst:
+                for chunk in read_object(backup_dir, entry["sha256"]):
+                    dst.write(chunk)
+    return zip_path
+
+def verify_backup(name):
+    """Check that every object referenced by a snapshot exists and matches its hash."""
+    backup_dir = get_backup_dir()
+    manifest = load_manifest(backup_dir, name)
+    problems = 0
+    for file_name, entry in manifest["files"].items():
+        hasher = hashlib.sha256()
+        try:
+            for chunk in read_object(backup_dir, entry["sha256"]):
+                hasher.update(chunk)
+        except (OSError, zlib.error) as e:
+            print(f"  ✗ {file_name}: {e}")
+            problems += 1
+            continue
+        if hasher.hexdigest() != entry["sha256"]:
+            print(f"  ✗ {file_name}: content does not match manifest")
+            problems += 1
+
+    if problems:
+        print(f"Verification failed: {problems} of {len(manifest['files'])} files damaged")
+        return False
+    print(f"Verified {len(manifest['files'])} files in {manifest['name']}")
+    return True
+
+def restore_backup(name, destination):
+    """Restore a snapshot's files into destination."""
+    backup_dir = get_backup_dir()
+    manifest = load_manifest(backup_dir, name)
+    destination = Path(destination)
+    for file_name, entry in manifest["files"].items():
+        target = destination / file_name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, 'wb') as f:
+            for chunk in read_object(backup_dir, entry["sha256"]):
+                f.write(chunk)
+        print(f"  ✓ Restored: {file_name}")
+    print(f"Restored {len(manifest['files'])} files from {manifest['name']} to {destination}")
+
+def prune_backups(keep):
+    """Keep the newest snapshots and delete objects no longer referenced."""
+    backup_dir = get_backup_dir()
+    manifests = list_manifests(backup_dir)
+    expired = manifests[:-keep] if keep > 0 else manifests
+    for manifest_path in expired:
+        manifest_path.unlink()
+        print(f"  🗑 Removed snapshot: {manifest_path.stem}")
+
+    referenced = set()
+    for manifest_path in list_manifests(backup_dir):
+        with open(manifest_path, 'r') as f:
+            referenced.update(entry["sha256"] for entry in json.load(f)["files"].values())
+
+    removed_objects = 0
+    cutoff = time.time() - PRUNE_GRACE_SECONDS
+    for object_file in (backup_dir / "objects").glob("*/*"):
+        # Leave other runs' in-flight temp files alone
+        if len(object_file.name) != OBJECT_NAME_LENGTH or object_file.name in referenced:
+            continue
+        try:
+            if object_file.stat().st_mtime > cutoff:
+                continue
+            object_file.unlink()
+        except FileNotFoundError:
+            continue
+        removed_objects += 1
+    print(f"Pruned {len(expired)} snapshots and {removed_objects} unreferenced objects")
 
 def list_backups():
     """List all available backups."""
-    backup_dir = Path.cwd() / "backups"
+    backup_dir = get_backup_dir()
     if not backup_dir.exists():
         print("No backup directory found.")
         return
-    
-    backups = list(backup_dir.glob("pishock_backup_*"))
-    if not backups:
+
+    manifests = list_manifests(backup_dir)
+    legacy = [b for b in backup_dir.glob("pishock_backup_*") if b.is_dir() or b.suffix == '.zip']
+    if not manifests and not legacy:
         print("No backups found.")
         return
-    
+
     print("Available backups:")
-    for backup in sorted(backups):
+    for manifest_path in manifests:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        total_size = sum(entry["size"] for entry in manifest["files"].values())
+        print(f"  🧾 {manifest_path.stem} ({len(manifest['files'])} files, {total_size / 1024:.1f} KB)")
+    for backup in sorted(legacy):
         if backup.is_dir():
             print(f"  📁 {backup.name}")
-        elif backup.suffix == '.zip':
+        else:
             print(f"  📦 {backup.name}")
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PiShock Project Backup Utility")
+    subparsers = parser.add_subparsers(dest="command")
+    create_parser = subparsers.add_parser("create", help="create a new snapshot (default)")
+    create_parser.add_argument("--zip", action="store_true", help="also export the snapshot as a zip archive")
+    subparsers.add_parser("list", help="list snapshots")
+    verify_parser = subparsers.add_parser("verify", help="check a snapshot against its manifest")
+    verify_parser.add_argument("name")
+    restore_parser = subparsers.add_parser("restore", help="restore a snapshot")
+    restore_parser.add_argument("name")
+    restore_parser.add_argument("destination", nargs="?", default="restored")
+    prune_parser = subparsers.add_parser("prune", help="delete old snapshots and unreferenced objects")
+    prune_parser.add_argument("--keep", type=int, default=10, help="number of newest snapshots to keep")
+    args = parser.parse_args(argv)
+
     print("PiShock Project Backup Utility")
     print("=" * 40)
-    
-    # Create the backup
-    backup_folder, zip_file = create_backup()
-    
-    print("\n" + "=" * 40)
-    list_backups()
+
+    if args.command == "list":
+        list_backups()
+    elif args.command == "verify":
+        return 0 if verify_backup(args.name) else 1
+    elif args.command == "restore":
+        restore_backup(args.name, args.destination)
+    elif args.command == "prune":
+        prune_backups(args.keep)
+    else:
+        # Create the backup
+        create_backup(make_zip=getattr(args, "zip", False))
+
+        print("\n" + "=" * 40)
+        list_backups()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
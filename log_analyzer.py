@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+PiShock Log Analyzer
+Summarises pishock_universal.log without loading it into memory.
+
+The log is memory-mapped and parsed in newline-aligned chunks. Large files
+are split into byte ranges that are analysed in parallel worker processes
+and merged, so multi-GB logs finish in seconds.
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+DEFAULT_LOG = "pishock_universal.log"
+CHUNK_SIZE = 32 * 1024 * 1024
+# Files smaller than this are not worth starting worker processes for
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# Each event is found by its own literal-prefixed regex, which the regex engine
+# scans for much faster than one anchored pattern tried at every line
+DELIVERED_RE = re.compile(rb"Shock delivered via (\w+)")
+FAILED_RE = re.compile(rb"Shock failed via (\w+): ([^\r\n]*)")
+PATTERN_RE = re.compile(rb"Pattern '[^\r\n]*' (delivered|aborted) via (\w+)")
+TIMESTAMP_LENGTH = len("2025-01-01 00:00:00")
+HOUR_LENGTH = len("2025-01-01 00")
+
+ERROR_CLASSES = (
+    ("rate limited", re.compile(r"\b429\b|Too Many Requests|rate limit", re.I)),
+    ("timeout", re.compile(r"timed out|Timeout", re.I)),
+    ("connection", re.compile(r"Max retries exceeded|Connection(Error| refused| reset| aborted)|NameResolution", re.I)),
+)
+HTTP_STATUS_RE = re.compile(r"\b([45]\d\d) (?:Client|Server) Error")
+
+BOUNDARY_KINDS = {
+    "PiShock Universal App initialized": "launch",
+    "Started listening": "start",
+    "Stopped listening": "stop",
+    "Emergency stop activated": "emergency",
+}
+BOUNDARY_RES = [(re.compile(re.escape(message.encode())), kind) for message, kind in BOUNDARY_KINDS.items()]
+
+def classify_error(message):
+    """Group a failure message into a coarse error class."""
+    for name, pattern in ERROR_CLASSES:
+        if pattern.search(message):
+            return name
+    status = HTTP_STATUS_RE.search(message)
+    if status:
+        return f"HTTP {status.group(1)}"
+    # Mask ids and numbers so otherwise identical messages group together
+    return re.sub(r"\d+", "N", message.split(": ")[-1])[:60] or "unknown"
+
+def line_timestamp(chunk, offset):
+    """Return the timestamp (to the second) of the line containing offset."""
+    start = chunk.rfind(b"\n", 0, offset) + 1
+    return chunk[start:start + TIMESTAMP_LENGTH].decode(errors="replace")
+
+def empty_result():
+    return {
+        "lines": 0,
+        "levels": Counter(),
+        "delivered": Counter(),
+        "failed": Counter(),
+        "patterns": Counter(),
+        "hours": defaultdict(lambda: [0, 0]),
+        "errors": Counter(),
+        "boundaries": [],
+    }
+
+def split_ranges(size, parts, mm):
+    """Split [0, size) into up to parts byte ranges that start on line boundaries."""
+    bounds = [0]
+    for i in range(1, parts):
+        newline = mm.find(b"\n", size * i // parts)
+        if newline == -1:
+            break
+        if newline + 1 > bounds[-1]:
+            bounds.append(newline + 1)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+def analyze_range(path, start, end):
+    """Analyse the lines in one byte range of the log. Runs in a worker process."""
+    result = empty_result()
+    hours = result["hours"]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            # Cut each chunk at a newline so no line is split between chunks
+            limit = min(pos + CHUNK_SIZE, end)
+            cut = mm.rfind(b"\n", pos, limit) + 1 if limit < end else end
+            if cut <= pos:
+                cut = limit
+            chunk = mm[pos:cut]
+            pos = cut
+
+            result["lines"] += chunk.count(b"\n")
+            for level in LEVELS:
+                result["levels"][level] += chunk.count(f" - {level} - ".encode())
+
+            # Counters are keyed by raw bytes here and decoded once when merged
+            rfind = chunk.rfind
+            delivered, failed, errors = result["delivered"], result["failed"], result["errors"]
+            for match in DELIVERED_RE.finditer(chunk):
+                delivered[match.group(1)] += 1
+                line_start = rfind(b"\n", 0, match.start()) + 1
+                hours[chunk[line_start:line_start + HOUR_LENGTH]][0] += 1
+            for match in FAILED_RE.finditer(chunk):
+                failed[match.group(1)] += 1
+                errors[match.group(2)] += 1
+                line_start = rfind(b"\n", 0, match.start()) + 1
+                hours[chunk[line_start:line_start + HOUR_LENGTH]][1] += 1
+            for match in PATTERN_RE.finditer(chunk):
+                result["patterns"][(match.group(2), match.group(1))] += 1
+
+            boundaries = [(match.start(), kind) for pattern, kind in BOUNDARY_RES for match in pattern.finditer(chunk)]
+            result["boundaries"].extend((line_timestamp(chunk, match_start), kind)
+                                        for match_start, kind in sorted(boundaries))
+    # defaultdict's factory can't be pickled back from a worker process
+    result["hours"] = dict(hours)
+    return result
+
+def merge_results(results):
+    """Combine per-range results, which must be in file order, and decode their keys."""
+    merged = empty_result()
+    for result in results:
+        merged["lines"] += result["lines"]
+        merged["levels"].update(result["levels"])
+        for key in ("delivered", "failed"):
+            for platform, count in result[key].items():
+                merged[key][platform.decode()] += count
+        for (platform, outcome), count in result["patterns"].items():
+            merged["patterns"][(platform.decode(), outcome.decode())] += count
+        # Most failures repeat the same few messages, so each distinct one is classified once
+        for message, count in result["errors"].items():
+            merged["errors"][classify_error(message.decode(errors="replace"))] += count
+        for hour, (delivered, failed) in result["hours"].items():
+            counts = merged["hours"][hour.decode(errors="replace")]
+            counts[0] += delivered
+            counts[1] += failed
+        merged["boundaries"].extend(result["boundaries"])
+    return merged
+
+def summarize_sessions(boundaries):
+    """Turn launch/start/stop/emergency markers into listening sessions."""
+    sessions = []
+    current = None
+    launches = emergencies = 0
+    for timestamp, kind in boundaries:
+        if kind == "launch":
+            launches += 1
+            # A launch while listening means the app exited without stopping
+            if current is not None:
+                sessions.append((current, None))
+                current = None
+        elif kind == "start":
+            # Every listening profile logs its own start line
+            if current is None:
+                current = timestamp
+        elif kind == "stop":
+            if current is not None:
+                sessions.append((current, timestamp))
+                current = None
+        else:
+            emergencies += 1
+    if current is not None:
+        sessions.append((current, None))
+
+    durations = [
+        (datetime.fromisoformat(stop) - datetime.fromisoformat(start)).total_seconds()
+        for start, stop in sessions if stop is not None
+    ]
+    return {
+        "launches": launches,
+        "emergency_stops": emergencies,
+        "sessions": len(sessions),
+        "unterminated_sessions": sum(1 for _, stop in sessions if stop is None),
+        "listening_seconds": sum(durations),
+        "longest_session_seconds": max(durations, default=0),
+        "first_session": sessions[0][0] if sessions else None,
+        "last_session": sessions[-1][0] if sessions else None,
+    }
+
+def analyze_log(path, jobs=None):
+    """Analyse a log file, in parallel if it is large enough."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return merge_results([])
+
+    jobs = jobs or os.cpu_count() or 1
+    if size < PARALLEL_THRESHOLD:
+        jobs = 1
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ranges = split_ranges(size, jobs, mm)
+
+    if len(ranges) == 1:
+        return merge_results([analyze_range(path, *ranges[0])])
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        return merge_results(executor.map(analyze_range, [path] * len(ranges), *zip(*ranges)))
+
+def build_report(result):
+    """Turn merged counters into a JSON-friendly report."""
+    platforms = set(result["delivered"]) | set(result["failed"]) | {platform for platform, _ in result["patterns"]}
+    return {
+        "lines": result["lines"],
+        "levels": {level: result["levels"][level] for level in LEVELS if result["levels"][level]},
+        "platforms": {
+            platform: {
+                "delivered": result["delivered"][platform],
+                "failed": result["failed"][platform],
+                "patterns_delivered": result["patterns"][(platform, "delivered")],
+                "patterns_aborted": result["patterns"][(platform, "aborted")],
+            }
+            for platform in sorted(platforms)
+        },
+        "hours": {hour: {"delivered": counts[0], "failed": counts[1]}
+                  for hour, counts in sorted(result["hours"].items())},
+        "errors": dict(result["errors"].most_common()),
+        "sessions": summarize_sessions(result["boundaries"]),
+    }
+
+def print_report(report, path, elapsed):
+    print(f"Log: {path} ({report['lines']} lines, analysed in {elapsed:.2f}s)")
+    print("Levels: " + (", ".join(f"{level} {count}" for level, count in report["levels"].items()) or "none"))
+
+    print("\nPer platform:")
+    if not report["platforms"]:
+        print("  No shocks logged.")
+    for platform, counts in report["platforms"].items():
+        total = counts["delivered"] + counts["failed"]
+        success = f"{counts['delivered'] / total:.1%}" if total else "n/a"
+        print(f"  {platform:<10} {counts['delivered']:>7} delivered {counts['failed']:>7} failed "
+              f"({success} success), patterns {counts['patterns_delivered']} delivered / "
+              f"{counts['patterns_aborted']} aborted")
+
+    if report["hours"]:
+        print("\nPer hour:")
+        for hour, counts in report["hours"].items():
+            print(f"  {hour}:00  {counts['delivered']:>6} delivered {counts['failed']:>6} failed")
+
+    if report["errors"]:
+        print("\nError classes:")
+        for error, count in report["errors"].items():
+            print(f"  {count:>7}  {error}")
+
+    sessions = report["sessions"]
+    print("\nSessions:")
+    print(f"  App launches: {sessions['launches']}")
+    print(f"  Listening sessions: {sessions['sessions']} ({sessions['unterminated_sessions']} without a stop)")
+    print(f"  Total listening time: {sessions['listening_seconds'] / 3600:.1f}h "
+          f"(longest {sessions['longest_session_seconds'] / 60:.0f} min)")
+    print(f"  Emergency stops: {sessions['emergency_stops']}")
+    if sessions["first_session"]:
+        print(f"  First/last session: {sessions['first_session']} / {sessions['last_session']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PiShock Log Analyzer")
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG, help=f"log file (default {DEFAULT_LOG})")
+    parser.add_argument("--jobs", type=int, help="worker processes for large logs (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.log):
+        print(f"Log file not found: {args.log}")
+        return 1
+
+    started = time.perf_counter()
+    report = build_report(analyze_log(args.log, args.jobs))
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.log, elapsed)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,19 @@ Supports both PiShock and OpenShock platforms with enhanced safety features.
 
 import threading
 import json
+import sys
+import os
+import mmap
+import struct
+import hashlib
+import tempfile
+import contextlib
+import argparse
+import functools
+import socket
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
 import requests
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
@@ -13,10 +26,18 @@ from pynput import keyboard
 import logging
 import time
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Literal
 import re
 from enum import Enum
+from types import MappingProxyType
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Configure logging
 logging.basicConfig(
@@ -29,25 +50,1387 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# How often the Tk thread drains key events queued by the keyboard hook
+KEY_POLL_MS = 10
+
+# Name of the profile created for settings files without profiles
+DEFAULT_PROFILE = "Default"
+
+# Seconds before an unanswered shock confirmation expires
+CONFIRMATION_TIMEOUT = 15
+
+# Max shocks are counted over this many seconds
+SAFETY_WINDOW = 60.0
+
+# Safety budget shared by every copy of the app (and other tools) on this machine
+SAFETY_LEDGER_PATH = Path(tempfile.gettempdir()) / "pishock_safety_ledger.bin"
+
+# Operation codes per API format. Type 0 is what this app has always sent to
+# the legacy /1/sendControl endpoint for a shock, so it is kept there for
+# compatibility; the v2 control endpoint uses Stop=0, Shock=1.
+PISHOCK_OPS = {"shock": "0", "vibrate": "1", "beep": "2"}
+OPENSHOCK_TYPES = {"shock": 0, "vibrate": 2, "beep": 3}
+OPENSHOCK_V2_TYPES = {"shock": 1, "vibrate": 2, "beep": 3}
+
 class Platform(Enum):
     PISHOCK = "pishock"
     OPENSHOCK = "openshock"
     PI3OPEN = "pi3open"
 
+class SharedLimitReason(str):
+    """A denial reason that came from the cross-process safety ledger."""
+
+class SafetyLimiter:
+    """Cooldown and max-shocks-per-minute limits driven by an injectable monotonic clock.
+
+    Using a monotonic clock keeps cooldowns correct across wall-clock jumps
+    (NTP, sleep/resume); injecting it lets simulations run on virtual time.
+    Thread-safe, since pattern threads draw from the same budget. With a
+    ledger, the devices' cooldown and per-minute budget are also shared with
+    other processes.
+    """
+
+    def __init__(self, clock=time.monotonic, ledger: Optional["SafetyLedger"] = None,
+                 ledger_keys: List[bytes] = ()):
+        self.clock = clock
+        self.ledger = ledger
+        self.ledger_keys = list(ledger_keys)
+        self.last_shock_time: Optional[float] = None
+        self.shock_count = 0  # Session total, for statistics
+        self._recent: deque = deque()  # Shock times within the last SAFETY_WINDOW
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.last_shock_time = None
+            self.shock_count = 0
+            self._recent.clear()
+
+    def _reason(self, now: float, cooldown: float, max_shocks: int) -> Optional[str]:
+        if self.last_shock_time is not None:
+            elapsed = now - self.last_shock_time
+            if elapsed < cooldown:
+                return f"Cooldown active - {cooldown - elapsed:.1f}s remaining"
+        recent = self._recent
+        while recent and now - recent[0] >= SAFETY_WINDOW:
+            recent.popleft()
+        if len(recent) >= max_shocks:
+            return "Rate limit reached - too many shocks this minute"
+        return None
+
+    def _record(self, now: float, count: bool):
+        self.last_shock_time = now
+        if count:
+            self.shock_count += 1
+            self._recent.append(now)
+
+    def check(self, cooldown: float, max_shocks: int) -> Optional[str]:
+        """Return the reason a shock is not allowed now, or None if it is."""
+        with self._lock:
+            reason = self._reason(self.clock(), cooldown, max_shocks)
+        if reason is None and self.ledger is not None:
+            return self.ledger.check(self.ledger_keys, cooldown, max_shocks)
+        return reason
+
+    def record(self, count: bool = True):
+        """Record a shock (or, with count=False, just restart the cooldown)."""
+        with self._lock:
+            self._record(self.clock(), count)
+            if self.ledger is not None:
+                self.ledger.record(self.ledger_keys, count)
+
+    def take(self, cooldown: float, max_shocks: int, count: bool = True) -> Optional[str]:
+        """Atomically check the limits and record a shock if they allow it.
+        
+        Returns the reason when they don't. With a ledger, the shared check and
+        record happen under one file lock, so two processes can't both pass.
+        """
+        with self._lock:
+            now = self.clock()
+            reason = self._reason(now, cooldown, max_shocks)
+            if reason is None and self.ledger is not None:
+                reason = self.ledger.take(self.ledger_keys, cooldown, max_shocks, count)
+            if reason is None:
+                self._record(now, count)
+            return reason
+
+    def seconds_since_last_shock(self) -> Optional[float]:
+        with self._lock:
+            if self.last_shock_time is None:
+                return None
+            return self.clock() - self.last_shock_time
+
+class SafetyLedger:
+    """Cooldown and per-minute budget shared by every local process, keyed by device.
+
+    State lives in a small memory-mapped file; each check or update takes a
+    file lock (plus a thread lock, since file locks don't exclude threads of
+    one process) and touches only one fixed-size slot per device. Timestamps
+    use the system-wide monotonic clock, so entries newer than "now" come from
+    before a reboot and are treated as stale.
+    """
+
+    MAGIC = b"PSLEDGR1"
+    SLOTS = 64
+    RING = 20  # The highest max shocks setting
+    # key digest, last shock, then a ring of recent shock times (0.0 = unused)
+    SLOT = struct.Struct(f"16sd{RING}d")
+    SIZE = len(MAGIC) + SLOTS * SLOT.size
+
+    def __init__(self, path=SAFETY_LEDGER_PATH, clock=time.monotonic):
+        self.path = Path(path)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.path.touch(exist_ok=True)
+        self._file = open(self.path, 'r+b')
+        if os.fstat(self._file.fileno()).st_size < self.SIZE:
+            with self._locked():
+                self._file.truncate(self.SIZE)
+        self._map = mmap.mmap(self._file.fileno(), self.SIZE)
+        with self._locked():
+            if self._map[:len(self.MAGIC)] != self.MAGIC:
+                self._map[:] = bytes(self.SIZE)
+                self._map[:len(self.MAGIC)] = self.MAGIC
+
+    @staticmethod
+    def device_key(platform: Platform, device: str) -> bytes:
+        return hashlib.sha256(f"{platform.value}:{device}".encode()).digest()[:16]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def check(self, keys: List[bytes], cooldown: float, max_shocks: int) -> Optional[str]:
+        """Return the reason a shock to these devices is not allowed now, or None."""
+        with self._locked():
+            return self._check(keys, self.clock(), cooldown, max_shocks)
+
+    def record(self, keys: List[bytes], count: bool = True):
+        """Record a shock to these devices (count=False only restarts the cooldown)."""
+        with self._locked():
+            now = self.clock()
+            for key in keys:
+                self._record(key, now, count)
+
+    def take(self, keys: List[bytes], cooldown: float, max_shocks: int, count: bool = True) -> Optional[str]:
+        """Check cooldown and per-minute budget and record the shock, all under one lock.
+        
+        Returns the reason the shock is denied, or None once it is recorded.
+        """
+        with self._locked():
+            now = self.clock()
+            reason = self._check(keys, now, cooldown, max_shocks)
+            if reason is None:
+                for key in keys:
+                    self._record(key, now, count)
+            return reason
+
+    def _check(self, keys, now, cooldown, max_shocks) -> Optional[str]:
+        for key in keys:
+            _, last_shock, recent = self._load(key, now)
+            if last_shock and now - last_shock < cooldown:
+                return SharedLimitReason(f"Cooldown active (shared) - {cooldown - (now - last_shock):.1f}s remaining")
+            if sum(1 for stamp in recent if stamp and now - stamp < SAFETY_WINDOW) >= max_shocks:
+                return SharedLimitReason("Rate limit reached (shared) - too many shocks this minute")
+        return None
+
+    def _record(self, key, now, count):
+        index, _, recent = self._load(key, now)
+        if count:
+            recent[recent.index(min(recent))] = now
+        self.SLOT.pack_into(self._map, self._offset(index), key, now, *recent)
+
+    def _load(self, key: bytes, now: float) -> tuple[int, float, List[float]]:
+        """Find (or claim) the slot for a key; returns (index, last shock, recent shocks)."""
+        start = int.from_bytes(key[:4], "little") % self.SLOTS
+        oldest = None
+        for probe in range(self.SLOTS):
+            index = (start + probe) % self.SLOTS
+            slot_key, last_shock, *recent = self.SLOT.unpack_from(self._map, self._offset(index))
+            if slot_key == key:
+                if last_shock > now or max(recent) > now:
+                    return index, 0.0, [0.0] * self.RING
+                return index, last_shock, recent
+            if slot_key == bytes(16):
+                return index, 0.0, [0.0] * self.RING
+            if oldest is None or last_shock < oldest[1]:
+                oldest = (index, last_shock)
+        # Table full: reuse the slot idle longest
+        return oldest[0], 0.0, [0.0] * self.RING
+
+    def _offset(self, index: int) -> int:
+        return len(self.MAGIC) + index * self.SLOT.size
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            fd = self._file.fileno()
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class VirtualClock:
+    """Manually advanced clock for simulations."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance_to(self, timestamp: float):
+        self.now = max(self.now, timestamp)
+
+def run_simulation(trace_lines, cooldown: int, max_shocks: int, out=sys.stdout) -> Dict[str, int]:
+    """Replay a timed trigger trace against the safety limits on a virtual clock.
+
+    Each trace line is '<seconds since start> <trigger word>'; blank lines and
+    '#' comments are ignored. Every allow/deny decision is written to out.
+    """
+    clock = VirtualClock()
+    limiter = SafetyLimiter(clock)
+    totals = {"allowed": 0, "denied": 0}
+    
+    for line_number, line in enumerate(trace_lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        timestamp, _, word = line.partition(" ")
+        try:
+            clock.advance_to(float(timestamp))
+        except ValueError:
+            raise ValueError(f"line {line_number}: invalid timestamp '{timestamp}'")
+        
+        reason = limiter.take(cooldown, max_shocks)
+        if reason is None:
+            totals["allowed"] += 1
+            out.write(f"[{clock.now:>10.3f}s] ALLOW {word.strip()} ({limiter.shock_count} total)\n")
+        else:
+            totals["denied"] += 1
+            out.write(f"[{clock.now:>10.3f}s] DENY  {word.strip()}: {reason}\n")
+    
+    out.write(f"\n{totals['allowed']} allowed, {totals['denied']} denied "
+              f"(cooldown {cooldown}s, max shocks {max_shocks})\n")
+    return totals
+
+class PendingConfirmation:
+    """A shock waiting for the user's answer in a non-modal prompt."""
+
+    def __init__(self, window, deadline: float, runtime: "ProfileRuntime", pattern: Optional[str] = None):
+        self.window = window
+        self.deadline = deadline
+        self.runtime = runtime
+        self.pattern = pattern
+        self.triggers = 1  # matches collapsed into this confirmation
+        self.countdown_var = tk.StringVar()
+        self.job = None
+
+class CommandConfig:
+    """Immutable command settings captured when listening starts.
+
+    Headers and the JSON body are serialized once, so dispatch never touches
+    Tk variables and can run on any thread. Only the variable fields are
+    patched into the pre-serialized body.
+    """
+
+    __slots__ = ("platform", "api_key", "duration", "intensity", "devices", "batch", "headers",
+                 "_prefixes", "_default_body")
+
+    def __init__(self, platform: Platform, api_key: str, credentials: Dict[str, str],
+                 duration: int, intensity: int, batch: bool = False):
+        set_field = functools.partial(object.__setattr__, self)
+        set_field("platform", platform)
+        set_field("api_key", api_key)
+        set_field("duration", duration)
+        set_field("intensity", intensity)
+        set_field("batch", batch and platform == Platform.OPENSHOCK)
+
+        # Everything up to the closing brace; variable fields are appended per command
+        if platform == Platform.OPENSHOCK:
+            headers = {
+                "Open-Shock-Token": api_key,
+                "User-Agent": "PiShock-Universal-App/1.0",
+                "Content-Type": "application/json"
+            }
+            # OpenShock accepts several comma-separated shocker IDs
+            devices = tuple(d.strip() for d in credentials["device_id"].split(",") if d.strip())
+            prefixes = {device: json.dumps({"deviceId": device})[:-1] for device in devices}
+        else:
+            headers = {"Content-Type": "application/json"}
+            devices = (credentials["device_id"],)
+            prefixes = {devices[0]: json.dumps({
+                "Username": credentials["username"],
+                "Apikey": api_key,
+                "Code": credentials["device_id"],
+                "Name": credentials["script_name"]
+            })[:-1]}
+        set_field("devices", devices)
+        set_field("headers", MappingProxyType(headers))
+        set_field("_prefixes", MappingProxyType(prefixes))
+        set_field("_default_body", self._render(devices[0], "shock", intensity, duration * 1000))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CommandConfig is immutable")
+
+    def _render(self, device: str, op: str, intensity: int, duration_ms: int) -> bytes:
+        if self.platform == Platform.OPENSHOCK:
+            tail = f', "type": {OPENSHOCK_TYPES[op]}, "intensity": {intensity}, "duration": {duration_ms}}}'
+        else:
+            duration = self.sent_duration_ms(duration_ms) // 1000
+            tail = f', "Op": "{PISHOCK_OPS[op]}", "Duration": "{duration}", "Intensity": "{intensity}"}}'
+        return (self._prefixes[device] + tail).encode()
+
+    def sent_duration_ms(self, duration_ms: int) -> int:
+        """Return the duration the device will actually run for a requested one."""
+        if self.platform == Platform.OPENSHOCK:
+            return duration_ms
+        # The PiShock format only takes whole seconds
+        return max(1, round(duration_ms / 1000)) * 1000
+
+    def body(self, intensity: Optional[int] = None, duration_ms: Optional[int] = None,
+             device: Optional[str] = None, op: Optional[str] = None) -> bytes:
+        """Return the JSON body, patching in any overridden fields."""
+        if intensity is None and duration_ms is None and device is None and op is None:
+            return self._default_body
+        return self._render(self.devices[0] if device is None else device,
+                            "shock" if op is None else op,
+                            self.intensity if intensity is None else intensity,
+                            self.duration * 1000 if duration_ms is None else duration_ms)
+
+    def control(self, device: str, intensity: Optional[int] = None, duration_ms: Optional[int] = None,
+                op: Optional[str] = None) -> Dict[str, Any]:
+        """Return one shocker entry for an OpenShock batch control request."""
+        return {
+            "id": device,
+            "type": OPENSHOCK_V2_TYPES["shock" if op is None else op],
+            "intensity": self.intensity if intensity is None else intensity,
+            "duration": self.duration * 1000 if duration_ms is None else duration_ms,
+            "exclusive": True
+        }
+
+class OpenShockBatcher:
+    """Coalesces OpenShock commands due within a flush interval into one request.
+
+    Commands are grouped per API token and sent as a single multi-shocker
+    control request. If the server rejects a batch because of a shocker (HTTP
+    400/404), it is split in half and retried, down to single shockers, so one
+    bad shocker ID doesn't fail the rest. Any other failure (auth, server,
+    network, throttling) would fail every half alike, so it is reported once
+    for every shocker in the batch. Per-shocker results are handed to
+    on_result(device, success, message) from the flush thread.
+    """
+
+    # Statuses the control endpoint returns for an unknown or invalid shocker
+    SHOCKER_ERROR_STATUSES = (400, 404)
+
+    def __init__(self, send_batch, on_result, flush_interval: float = 0.05):
+        self.send_batch = send_batch  # (config, controls) -> None; raises on failure
+        self.on_result = on_result
+        self.flush_interval = flush_interval
+        self._pending: List[tuple] = []  # (config, control)
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, config: CommandConfig, control: Dict[str, Any]):
+        """Queue a control entry; it is sent with everything else due in this interval."""
+        with self._lock:
+            self._pending.append((config, control))
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def cancel(self):
+        """Drop any commands not yet sent."""
+        with self._lock:
+            self._pending = []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def flush(self):
+        """Send everything queued so far."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()  # No-op when the timer itself is flushing
+                self._timer = None
+        
+        groups: Dict[str, tuple] = {}
+        for config, control in pending:
+            groups.setdefault(config.api_key, (config, []))[1].append(control)
+        for config, controls in groups.values():
+            self._send(config, controls)
+
+    def _send(self, config: CommandConfig, controls: List[Dict[str, Any]]):
+        try:
+            self.send_batch(config, controls)
+        except Exception as e:
+            if len(controls) > 1 and self._blames_shocker(e):
+                logger.warning(f"OpenShock batch of {len(controls)} rejected ({e}) - splitting")
+                middle = len(controls) // 2
+                self._send(config, controls[:middle])
+                self._send(config, controls[middle:])
+                return
+            for control in controls:
+                self.on_result(control["id"], False, str(e))
+            return
+        
+        for control in controls:
+            self.on_result(control["id"], True, "OpenShock shock sent successfully")
+
+    @classmethod
+    def _blames_shocker(cls, error: Exception) -> bool:
+        response = getattr(error, "response", None)
+        return (isinstance(error, requests.HTTPError) and response is not None
+                and response.status_code in cls.SHOCKER_ERROR_STATUSES)
+
+class PatternStep:
+    """One step of a pulse pattern."""
+
+    __slots__ = ("op", "intensity", "duration_ms", "gap_ms")
+
+    def __init__(self, op: str, intensity: int, duration_ms: int, gap_ms: int = 0):
+        self.op = op
+        self.intensity = intensity
+        self.duration_ms = duration_ms
+        self.gap_ms = gap_ms
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PatternStep":
+        """Build a step from its settings-file form, validating every field."""
+        op = data.get("op", "shock")
+        if op not in PISHOCK_OPS:
+            raise ValueError(f"unknown op '{op}' (use {', '.join(PISHOCK_OPS)})")
+        intensity = int(data["intensity"])
+        duration_ms = int(data["duration_ms"])
+        gap_ms = int(data.get("gap_ms", 0))
+        if not 1 <= intensity <= 100:
+            raise ValueError("intensity must be between 1 and 100")
+        if not 100 <= duration_ms <= 15000:
+            raise ValueError("duration_ms must be between 100 and 15000")
+        if not 0 <= gap_ms <= 60000:
+            raise ValueError("gap_ms must be between 0 and 60000")
+        return cls(op, intensity, duration_ms, gap_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"op": self.op, "intensity": self.intensity, "duration_ms": self.duration_ms, "gap_ms": self.gap_ms}
+
+class PatternSequencer:
+    """Runs a pattern's steps on a monotonic schedule in a worker thread.
+
+    Step start times are absolute offsets from the pattern start, so a late
+    send never pushes back the steps after it. Commands are rendered before
+    the first step, the thread sleeps until just before each target and then
+    spins for the last couple of milliseconds.
+    """
+
+    SPIN_WINDOW = 0.002
+
+    def __init__(self, allow_step, on_finish):
+        self.allow_step = allow_step  # (step) -> Optional[str] reason to abort
+        self.on_finish = on_finish  # (name, steps_sent, total_steps, jitters_ms, abort_reason)
+        self._abort_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, name: str, steps: List[PatternStep], prepare):
+        """Start running steps.
+        
+        prepare(step) pre-renders each step as (send, duration_ms): a callable
+        returning (success, message) and the duration the device actually runs,
+        which the schedule advances by so rounded steps never overlap.
+        """
+        prepared = [prepare(step) for step in steps]
+        self._abort_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(name, steps, prepared),
+                                        name=f"pattern-{name}", daemon=True)
+        self._thread.start()
+
+    def abort(self):
+        """Abort the running pattern before its next step."""
+        self._abort_event.set()
+
+    def _run(self, name: str, steps: List[PatternStep], prepared: List[Any]):
+        jitters = []
+        sent = 0
+        abort_reason = None
+        start = time.perf_counter()
+        offset = 0.0
+        
+        for step, (send, duration_ms) in zip(steps, prepared):
+            target = start + offset
+            offset += (duration_ms + step.gap_ms) / 1000
+            
+            remaining = target - time.perf_counter()
+            if remaining > self.SPIN_WINDOW and self._abort_event.wait(remaining - self.SPIN_WINDOW):
+                abort_reason = "aborted"
+                break
+            while time.perf_counter() < target:
+                pass
+            if self._abort_event.is_set():
+                abort_reason = "aborted"
+                break
+            
+            abort_reason = self.allow_step(step)
+            if abort_reason:
+                break
+            
+            jitters.append((time.perf_counter() - target) * 1000)
+            success, message = send()
+            if not success:
+                abort_reason = f"step failed: {message}"
+                break
+            sent += 1
+        
+        self.on_finish(name, sent, len(steps), jitters, abort_reason)
+
+class TriggerMatcher:
+    """Aho-Corasick automaton over the trigger words of every listening profile.
+
+    Each keystroke costs one state transition no matter how many profiles or
+    words there are. feed() returns one (profile, word) match per profile whose
+    word ends at this keystroke. The automaton itself never restarts; instead
+    each profile only matches words typed entirely after its previous match
+    (like clearing that profile's old per-word buffer did), so profiles stay
+    independent of each other.
+    """
+
+    def __init__(self, tagged_words: List[tuple[str, str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple[str, str, int]]] = [[]]
+        self.state = 0
+        self.position = 0  # Keystrokes fed so far
+        self._last_match: Dict[str, int] = {}  # profile -> position of its last match
+        
+        for word, profile in tagged_words:
+            state = 0
+            for ch in word.lower():
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append((profile, word.lower(), len(word)))
+        
+        # Breadth-first pass to fill in failure links and inherited outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        
+        # Longest first, so each profile's longest eligible word wins
+        for outputs in self._out:
+            outputs.sort(key=lambda output: -output[2])
+
+    def reset(self):
+        self.state = 0
+        self._last_match.clear()
+
+    def feed(self, ch: str) -> List[tuple[str, str]]:
+        """Advance by one character; returns (profile, word) matches ending here."""
+        ch = ch.lower()
+        state = self.state
+        goto = self._goto
+        while state and ch not in goto[state]:
+            state = self._fail[state]
+        state = goto[state].get(ch, 0)
+        self.state = state
+        self.position = position = self.position + 1
+        
+        outputs = self._out[state]
+        if not outputs:
+            return []
+        matches = []
+        last_match = self._last_match
+        for profile, word, length in outputs:
+            # A word that overlaps this profile's previous match doesn't count
+            if position - length >= last_match.get(profile, 0):
+                last_match[profile] = position
+                matches.append((profile, word))
+        return matches
+
+class ProfileRuntime:
+    """Per-profile state while listening: frozen command config, limits and patterns."""
+
+    def __init__(self, name: str, config: CommandConfig, cooldown: int, max_shocks: int,
+                 word_patterns: Dict[str, str], clock, ledger: Optional[SafetyLedger] = None):
+        self.name = name
+        self.config = config
+        self.cooldown = cooldown
+        self.max_shocks = max_shocks
+        self.word_patterns = word_patterns
+        self.safety = SafetyLimiter(clock, ledger, [SafetyLedger.device_key(config.platform, device)
+                                                    for device in config.devices])
+        self.sequencer: Optional[PatternSequencer] = None
+
+class InputService:
+    """One long-lived keyboard hook shared by every input consumer.
+
+    The OS hook and its thread are installed once, on the first subscription,
+    and kept until the app exits. Consumers are named subscribers that can be
+    paused and resumed instantly, so starting and stopping listening never
+    re-installs hooks or drops keystrokes. Callbacks run on the hook thread
+    and must return quickly.
+    """
+
+    def __init__(self, listener_factory=None):
+        self._listener_factory = listener_factory or keyboard.Listener
+        self._listener = None
+        self._subscribers: Dict[str, list] = {}  # name -> [on_press, on_release, active]
+        # Rebuilt on every change and read without locking by the hook thread
+        self._active: tuple = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, name: str, on_press, on_release=None):
+        """Add (or replace) an active subscriber, starting the hook if needed."""
+        with self._lock:
+            self._subscribers[name] = [on_press, on_release, True]
+            self._rebuild()
+            if self._listener is None:
+                self._listener = self._listener_factory(on_press=self._on_press, on_release=self._on_release)
+                self._listener.start()
+
+    def unsubscribe(self, name: str):
+        with self._lock:
+            if self._subscribers.pop(name, None) is not None:
+                self._rebuild()
+
+    def pause(self, name: str):
+        self._set_active(name, False)
+
+    def resume(self, name: str):
+        self._set_active(name, True)
+
+    def is_active(self, name: str) -> bool:
+        subscriber = self._subscribers.get(name)
+        return subscriber is not None and subscriber[2]
+
+    def canonical(self, key):
+        """Normalise a key (e.g. left/right modifiers) for hotkey matching."""
+        return self._listener.canonical(key)
+
+    def stop(self):
+        """Remove the OS hook. Only done at exit."""
+        with self._lock:
+            self._subscribers.clear()
+            self._rebuild()
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener = None
+
+    def _set_active(self, name: str, active: bool):
+        with self._lock:
+            subscriber = self._subscribers.get(name)
+            if subscriber is not None and subscriber[2] != active:
+                subscriber[2] = active
+                self._rebuild()
+
+    def _rebuild(self):
+        self._active = tuple((on_press, on_release) for on_press, on_release, active
+                             in self._subscribers.values() if active)
+
+    # pynput stops the hook if a callback raises, so one failing subscriber
+    # must not take the emergency hotkey down with it
+    def _on_press(self, key):
+        for on_press, _ in self._active:
+            try:
+                on_press(key)
+            except Exception:
+                logger.exception("Keyboard subscriber failed on key press")
+
+    def _on_release(self, key):
+        for _, on_release in self._active:
+            if on_release is None:
+                continue
+            try:
+                on_release(key)
+            except Exception:
+                logger.exception("Keyboard subscriber failed on key release")
+
+# Keystroke traces are append-only: a magic header, then length-prefixed records
+# of <varint length><kind><varint microseconds since previous record><fields>
+TRACE_MAGIC = b"PSTRACE1"
+TRACE_SESSION, TRACE_KEY, TRACE_SPECIAL, TRACE_MATCH, TRACE_OUTCOME, TRACE_DELIVERY = range(6)
+TRACE_SPECIAL_KEYS = ("other", "space", "enter", "backspace", "tab", "esc", "shift", "shift_r",
+                      "ctrl", "ctrl_l", "ctrl_r", "alt", "alt_l", "alt_r", "alt_gr", "cmd", "cmd_r",
+                      "caps_lock", "delete", "left", "right", "up", "down", "home", "end")
+# Redacted characters are not in any trigger word, so they reset the matcher exactly as the originals did
+TRACE_REDACTED = "\x00"
+
+def _write_varint(buf: bytearray, value: int):
+    while value > 0x7F:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _read_stream_varint(f) -> Optional[int]:
+    """Read a varint from a file; None at end of file or in a truncated varint."""
+    value = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+def _write_str(buf: bytearray, text: str):
+    encoded = text.encode("utf-8")
+    _write_varint(buf, len(encoded))
+    buf += encoded
+
+def _read_str(data: bytes, pos: int) -> tuple[str, int]:
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length].decode("utf-8"), pos + length
+
+class TraceRecorder:
+    """Records matcher-relevant input events to a compact binary trace file.
+
+    Only called from the Tk thread. With redaction on, characters that are not
+    part of any trigger word are stored as a placeholder, so the trace replays
+    identically without capturing what was typed.
+    """
+
+    def __init__(self, path, redact: bool = True):
+        self.path = Path(path)
+        self.redact = redact
+        self._file = None
+        self._alphabet = frozenset()
+        self._last = None
+
+    def start(self, profiles: List[tuple[str, int, int, List[str]]]):
+        """Open the trace and write a session record of (name, cooldown, max_shocks, words)."""
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, 'ab')
+        if new_file:
+            self._file.write(TRACE_MAGIC)
+        self._alphabet = frozenset(ch for _, _, _, words in profiles for word in words for ch in word.lower())
+        self._last = None
+        
+        payload = self._payload(TRACE_SESSION, None)
+        _write_varint(payload, int(time.time()))
+        payload.append(1 if self.redact else 0)
+        _write_varint(payload, len(profiles))
+        for name, cooldown, max_shocks, words in profiles:
+            _write_str(payload, name)
+            _write_varint(payload, cooldown)
+            _write_varint(payload, max_shocks)
+            _write_varint(payload, len(words))
+            for word in words:
+                _write_str(payload, word.lower())
+        self._write(payload)
+
+    def stop(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def key(self, stamp: float, key):
+        """Record a key press: a character, or a special key by code."""
+        if self._file is None:
+            return
+        if isinstance(key, str):
+            ch = key.lower()
+            if self.redact and ch not in self._alphabet:
+                ch = TRACE_REDACTED
+            payload = self._payload(TRACE_KEY, stamp)
+            payload += ch.encode("utf-8")
+        else:
+            name = getattr(key, "name", None)
+            payload = self._payload(TRACE_SPECIAL, stamp)
+            _write_varint(payload, TRACE_SPECIAL_KEYS.index(name) if name in TRACE_SPECIAL_KEYS else 0)
+        self._write(payload)
+
+    def match(self, profile: str, word: str):
+        """Record a trigger match for the key just recorded."""
+        if self._file is None:
+            return
+        payload = self._payload(TRACE_MATCH, None)
+        _write_str(payload, profile)
+        _write_str(payload, word)
+        self._write(payload)
+
+    def outcome(self, profile: str, allowed: bool, shared: bool = False):
+        """Record the safety decision for the match just recorded.
+        
+        shared marks a denial that came from the cross-process safety ledger.
+        """
+        if self._file is None:
+            return
+        payload = self._payload(TRACE_OUTCOME, None)
+        _write_str(payload, profile)
+        payload.append(1 if allowed else 2 if shared else 0)
+        self._write(payload)
+
+    def delivery(self, stamp: float, profile: str, counted: bool = True):
+        """Record a shock (or, uncounted, a pattern start) taking the safety budget."""
+        if self._file is None:
+            return
+        payload = self._payload(TRACE_DELIVERY, stamp)
+        _write_str(payload, profile)
+        payload.append(1 if counted else 0)
+        self._write(payload)
+
+    def _payload(self, kind: int, stamp: Optional[float]) -> bytearray:
+        delta = 0
+        if stamp is not None:
+            if self._last is not None:
+                delta = max(0, round((stamp - self._last) * 1_000_000))
+            # Keys can be drained after a later-stamped delivery; never step back
+            self._last = stamp if self._last is None else max(stamp, self._last)
+        payload = bytearray([kind])
+        _write_varint(payload, delta)
+        return payload
+
+    def _write(self, payload: bytearray):
+        record = bytearray()
+        _write_varint(record, len(payload))
+        self._file.write(record + payload)
+
+def _parse_trace_record(data: bytes, start: int, end: int) -> tuple[int, int, tuple]:
+    """Decode one record's payload into (kind, microsecond delta, fields)."""
+    kind = data[start]
+    delta, pos = _read_varint(data, start + 1)
+    if kind == TRACE_SESSION:
+        started, pos = _read_varint(data, pos)
+        redacted = bool(data[pos])
+        count, pos = _read_varint(data, pos + 1)
+        profiles = []
+        for _ in range(count):
+            name, pos = _read_str(data, pos)
+            cooldown, pos = _read_varint(data, pos)
+            max_shocks, pos = _read_varint(data, pos)
+            word_count, pos = _read_varint(data, pos)
+            words = []
+            for _ in range(word_count):
+                word, pos = _read_str(data, pos)
+                words.append(word)
+            profiles.append((name, cooldown, max_shocks, words))
+        fields = (started, redacted, profiles)
+    elif kind == TRACE_KEY:
+        fields, pos = (data[pos:end].decode("utf-8"),), end
+    elif kind == TRACE_SPECIAL:
+        code, pos = _read_varint(data, pos)
+        fields = (TRACE_SPECIAL_KEYS[code] if code < len(TRACE_SPECIAL_KEYS) else "other",)
+    elif kind == TRACE_MATCH:
+        profile, pos = _read_str(data, pos)
+        word, pos = _read_str(data, pos)
+        fields = (profile, word)
+    elif kind == TRACE_OUTCOME:
+        profile, pos = _read_str(data, pos)
+        fields, pos = (profile, data[pos] == 1, data[pos] == 2), pos + 1
+    elif kind == TRACE_DELIVERY:
+        profile, pos = _read_str(data, pos)
+        fields, pos = (profile, bool(data[pos])), pos + 1
+    else:
+        fields, pos = (), end
+    if pos > end:
+        raise IndexError("record overruns its length")
+    return kind, delta, fields
+
+def read_trace(path):
+    """Yield (kind, seconds since session start, fields) for every record in a trace.
+
+    Records are read from the file one at a time, so traces of any size
+    stream in constant memory. A truncated final record (e.g. after a crash)
+    is ignored; any other damage raises ValueError.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        offset = 0.0
+        while True:
+            pos = f.tell()
+            length = _read_stream_varint(f)
+            if length is None:
+                return
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            try:
+                kind, delta, fields = _parse_trace_record(payload, 0, length)
+            except (IndexError, UnicodeDecodeError):
+                raise ValueError(f"{path}: corrupt trace record at byte {pos}")
+            
+            offset = 0.0 if kind == TRACE_SESSION else offset + delta / 1_000_000
+            yield kind, offset, fields
+
+def replay_trace(path, realtime: bool = False, cooldown: Optional[int] = None,
+                 max_shocks: Optional[int] = None, out=sys.stdout, sleep=time.sleep) -> Dict[str, int]:
+    """Stream a recorded trace through the trigger matcher and safety limits.
+
+    Runs on a virtual clock, as fast as possible unless realtime is set.
+    Cooldown and max shocks default to each profile's recorded values. With
+    the recorded values, the budget is spent by the recorded deliveries (so
+    cancelled confirmations and late denials replay faithfully) and decisions
+    that differ from the recording are flagged. Denials by the shared ledger
+    are never flagged, and a session stops being compared once a pattern
+    starts, since pattern steps aren't recorded. With overridden limits,
+    every allowed match is simulated as a delivered single shock.
+    """
+    totals = {"keys": 0, "allowed": 0, "denied": 0, "diverged": 0}
+    clock = VirtualClock()
+    matcher = TriggerMatcher([])
+    limits: Dict[str, tuple[SafetyLimiter, int, int]] = {}
+    expected = deque()
+    compare = cooldown is None and max_shocks is None
+    comparing = compare
+    
+    def limits_for(profile: str) -> tuple[SafetyLimiter, int, int]:
+        if profile not in limits:
+            raise ValueError(f"{path}: record for profile '{profile}' that is not in its session")
+        return limits[profile]
+    
+    for kind, offset, fields in read_trace(path):
+        if kind == TRACE_SESSION:
+            started, redacted, profiles = fields
+            clock = VirtualClock()
+            matcher = TriggerMatcher([(word, name) for name, _, _, words in profiles for word in words])
+            limits = {name: (SafetyLimiter(clock),
+                             profile_cooldown if cooldown is None else cooldown,
+                             profile_max if max_shocks is None else max_shocks)
+                      for name, profile_cooldown, profile_max, _ in profiles}
+            expected.clear()
+            comparing = compare
+            out.write(f"# Session {datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S')}, "
+                      f"{len(profiles)} profile(s){', redacted' if redacted else ''}\n")
+            continue
+        
+        if realtime and offset > clock.now:
+            sleep(offset - clock.now)
+        clock.advance_to(offset)
+        
+        if kind == TRACE_KEY:
+            totals["keys"] += 1
+            for profile, word in matcher.feed(fields[0]):
+                limiter, profile_cooldown, profile_max = limits_for(profile)
+                if compare:
+                    reason = limiter.check(profile_cooldown, profile_max)
+                else:
+                    reason = limiter.take(profile_cooldown, profile_max)
+                expected.append((profile, reason is None))
+                if reason is None:
+                    totals["allowed"] += 1
+                    out.write(f"[{clock.now:>10.3f}s] ALLOW {word} [{profile}] ({limiter.shock_count} total)\n")
+                else:
+                    totals["denied"] += 1
+                    out.write(f"[{clock.now:>10.3f}s] DENY  {word} [{profile}]: {reason}\n")
+        elif kind == TRACE_OUTCOME and compare:
+            profile, allowed, shared = fields
+            replayed = expected.popleft() if expected else None
+            # Other processes' shocks aren't in the trace, so shared denials can't be reproduced
+            if comparing and not shared and replayed != (profile, allowed):
+                totals["diverged"] += 1
+                out.write(f"[{clock.now:>10.3f}s] DIVERGED [{profile}]: recorded "
+                          f"{'ALLOW' if allowed else 'DENY'}, replayed "
+                          f"{'none' if replayed is None else 'ALLOW' if replayed[1] else 'DENY'}\n")
+        elif kind == TRACE_DELIVERY and compare:
+            profile, counted = fields
+            limits_for(profile)[0].record(count=counted)
+            if not counted and comparing:
+                comparing = False
+                out.write(f"[{clock.now:>10.3f}s] # Pattern started [{profile}]: its steps aren't recorded, "
+                          f"so the rest of this session is not compared\n")
+    
+    out.write(f"\n{totals['keys']} keys, {totals['allowed']} allowed, {totals['denied']} denied")
+    if compare:
+        out.write(f", {totals['diverged']} diverged from recording")
+    out.write("\n")
+    return totals
+
+class ProfilingSession:
+    """Low-overhead profiler for the input and dispatch hot paths.
+
+    Combines a sampling profiler (folded stacks, flame-graph compatible) with
+    wall-clock timers wrapped around selected instance methods.
+    """
+
+    HOT_PATHS = ("on_press", "_drain_key_events", "shock", "_check_safety_limits", "_send_shock_command")
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.timings: Dict[str, List[int]] = {}  # name -> [calls, total_ns, min_ns, max_ns]
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._wrapped: List[str] = []
+
+    def start(self, target=None):
+        """Start sampling and wrap the hot-path methods of target."""
+        if target is not None:
+            for name in self.HOT_PATHS:
+                setattr(target, name, self._timed(name, getattr(target, name)))
+                self._wrapped.append(name)
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self, target=None):
+        """Stop sampling and restore the original methods on target."""
+        self._stop_event.set()
+        if self._sampler:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+        if target is not None:
+            for name in self._wrapped:
+                target.__dict__.pop(name, None)
+        self._wrapped = []
+
+    def _timed(self, name, func):
+        """Wrap func so every call is recorded under name."""
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter_ns() - start)
+        return timed
+
+    def _record(self, name: str, elapsed_ns: int):
+        with self._lock:
+            stats = self.timings.get(name)
+            if stats is None:
+                self.timings[name] = [1, elapsed_ns, elapsed_ns, elapsed_ns]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed_ns
+                stats[2] = min(stats[2], elapsed_ns)
+                stats[3] = max(stats[3], elapsed_ns)
+
+    def _sample_loop(self):
+        """Periodically capture the stack of every other thread."""
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stack.reverse()
+                with self._lock:
+                    self.samples[";".join(stack)] += 1
+
+    def dump(self, prefix: Optional[str] = None) -> tuple[Path, Path]:
+        """Write folded stacks and per-function stats, returning both paths."""
+        if prefix is None:
+            prefix = f"pishock_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        folded_path = Path(f"{prefix}.folded")
+        stats_path = Path(f"{prefix}_stats.txt")
+
+        with self._lock:
+            samples = dict(self.samples)
+            timings = {name: list(stats) for name, stats in self.timings.items()}
+
+        with open(folded_path, 'w') as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        # Self time per function comes from the leaf frame of each sample
+        leaf_counts: Counter = Counter()
+        for stack, count in samples.items():
+            leaf_counts[stack.rsplit(";", 1)[-1]] += count
+        total_samples = sum(leaf_counts.values()) or 1
+
+        with open(stats_path, 'w') as f:
+            f.write(f"Profile duration: {time.time() - self.started_at:.1f}s, "
+                    f"sample interval: {self.interval * 1000:.1f}ms\n\n")
+            f.write(f"{'Function':<28}{'Calls':>8}{'Total ms':>12}{'Mean us':>12}{'Min us':>10}{'Max us':>10}\n")
+            for name, (calls, total, low, high) in sorted(timings.items()):
+                f.write(f"{name:<28}{calls:>8}{total / 1e6:>12.2f}{total / calls / 1e3:>12.1f}"
+                        f"{low / 1e3:>10.1f}{high / 1e3:>10.1f}\n")
+            f.write(f"\nTop sampled functions (self time, {total_samples} samples):\n")
+            for name, count in leaf_counts.most_common(25):
+                f.write(f"{count / total_samples:>7.1%}  {name}\n")
+
+        logger.info(f"Profile written to {folded_path} and {stats_path}")
+        return folded_path, stats_path
+
+class EndpointHealthMonitor:
+    """Background health monitor for API endpoints.
+
+    Probes each route with a TCP connect, so no command ever reaches a device,
+    and keeps rolling RTT and availability stats used to pick the fastest
+    healthy route per platform.
+    """
+
+    def __init__(self, routes: Dict[Platform, List[str]], interval: float = 30.0,
+                 window: int = 20, timeout: float = 5.0):
+        self.routes = routes
+        self.interval = interval
+        self.window = window
+        self.timeout = timeout
+        self._results: Dict[str, deque] = {}  # url -> deque of RTT seconds, None for failures
+        self._best: Dict[Platform, str] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start probing in a daemon thread."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="endpoint-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop probing."""
+        self._stop_event.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.probe_all()
+            self._stop_event.wait(self.interval)
+
+    def probe_all(self):
+        """Probe every known route once and update route selection."""
+        urls = {url for platform_routes in self.routes.values() for url in platform_routes}
+        for url in urls:
+            if self._stop_event.is_set():
+                return
+            rtt = self._probe(url)
+            with self._lock:
+                self._results.setdefault(url, deque(maxlen=self.window)).append(rtt)
+        self._select_routes()
+
+    def _probe(self, url: str) -> Optional[float]:
+        """Time a TCP connect to the endpoint host; None if unreachable."""
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((parts.hostname, port), timeout=self.timeout):
+                return time.perf_counter() - start
+        except OSError:
+            return None
+
+    def stats(self, url: str) -> Dict[str, Any]:
+        """Return rolling stats for a route."""
+        with self._lock:
+            results = list(self._results.get(url, ()))
+        rtts = [r for r in results if r is not None]
+        return {
+            "probes": len(results),
+            "availability": len(rtts) / len(results) if results else None,
+            "avg_rtt": sum(rtts) / len(rtts) if rtts else None,
+            "last_rtt": results[-1] if results else None,
+            "healthy": bool(results) and results[-1] is not None and len(rtts) / len(results) >= 0.5,
+        }
+
+    def _select_routes(self):
+        """Pick the fastest healthy route for each platform."""
+        for platform, platform_routes in self.routes.items():
+            healthy = []
+            for url in platform_routes:
+                url_stats = self.stats(url)
+                if url_stats["healthy"]:
+                    healthy.append((url_stats["avg_rtt"], url))
+            best = min(healthy)[1] if healthy else platform_routes[0]
+            with self._lock:
+                previous = self._best.get(platform)
+                self._best[platform] = best
+            if previous is not None and previous != best:
+                logger.info(f"Route for {platform.value} switched from {previous} to {best}")
+
+    def best_route(self, platform: Platform) -> str:
+        """Return the preferred route for a platform (first route until probed)."""
+        with self._lock:
+            best = self._best.get(platform)
+        return best if best in self.routes[platform] else self.routes[platform][0]
+
+class ThrottledError(Exception):
+    """Raised instead of sending a request the server would reject."""
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from Retry-After or an exhausted rate-limit header, if any."""
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    for prefix in ("X-RateLimit-", "RateLimit-"):
+        if headers.get(prefix + "Remaining") == "0" and headers.get(prefix + "Reset"):
+            try:
+                reset = float(headers[prefix + "Reset"])
+            except ValueError:
+                continue
+            # Reset is either seconds from now or an epoch timestamp
+            return max(0.0, reset - time.time() if reset > 1e9 else reset)
+    return None
+
+class EndpointThrottle:
+    """AIMD send-rate and concurrency controller for one API host.
+
+    Rate-limit responses and latency spikes halve (or cut) the allowed rate and
+    concurrency; each healthy response adds a little back. A request that
+    would exceed the current budget is refused immediately rather than queued,
+    so a shock is never delivered late.
+    """
+
+    MIN_RATE = 0.2
+    RATE_STEP = 0.5
+    LATENCY_SPIKE_FACTOR = 3.0
+    LATENCY_SPIKE_FLOOR = 0.5
+
+    def __init__(self, max_rate: float = 10.0, max_concurrency: int = 4, clock=time.monotonic):
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self.rate = max_rate
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.avg_latency: Optional[float] = None
+        self._tokens = max_rate
+        self._refilled = clock()
+        self._last_decrease = float("-inf")
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[str]:
+        """Reserve a send slot; returns a reason if the request must not be sent."""
+        with self._lock:
+            now = self.clock()
+            if now < self.blocked_until:
+                return f"Rate limited by server - retry in {self.blocked_until - now:.1f}s"
+            if self.in_flight >= self.concurrency:
+                return f"Too many requests in flight ({self.in_flight}/{self.concurrency})"
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1.0:
+                return f"Send rate limited to {self.rate:.1f}/s"
+            self._tokens -= 1.0
+            self.in_flight += 1
+            return None
+
+    def release(self, status: Optional[int], latency: float, retry_after: Optional[float] = None):
+        """Record a finished request (status None for a network error) and adapt."""
+        with self._lock:
+            now = self.clock()
+            self.in_flight -= 1
+            spike = (self.avg_latency is not None and
+                     latency > max(self.LATENCY_SPIKE_FACTOR * self.avg_latency, self.LATENCY_SPIKE_FLOOR))
+            self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+            
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            if status == 429:
+                self.blocked_until = max(self.blocked_until, now + 1.0 / self.rate)
+                self._decrease(now, 0.5)
+            elif spike or status is None or status >= 500:
+                self._decrease(now, 0.7)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.RATE_STEP)
+                self._successes += 1
+                if self._successes >= self.concurrency:
+                    self._successes = 0
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def _decrease(self, now: float, factor: float):
+        # One cut per round trip, so a burst of rejections doesn't collapse the rate to the floor
+        if now - self._last_decrease < (self.avg_latency or 1.0):
+            return
+        self._last_decrease = now
+        self._successes = 0
+        self.rate = max(self.MIN_RATE, self.rate * factor)
+        self.concurrency = max(1, int(self.concurrency * factor))
+        self._tokens = min(self._tokens, 1.0)
+
+    def summary(self) -> str:
+        """Describe the current effective send rate."""
+        with self._lock:
+            remaining = self.blocked_until - self.clock()
+            text = f"{self.rate:.1f}/s of {self.max_rate:.0f}/s, {self.concurrency} concurrent"
+            if remaining > 0:
+                text += f", blocked {remaining:.0f}s"
+            return text
+
 class PiShockUniversalApp:
-    def __init__(self, master):
+    def __init__(self, master, profiling: bool = False, clock=time.monotonic,
+                 trace_recorder: Optional[TraceRecorder] = None,
+                 safety_ledger: Optional[SafetyLedger] = None):
         self.master = master
+        self.clock = clock
+        self.trace_recorder = trace_recorder
+        self.safety_ledger = safety_ledger
         self.api_key: Optional[str] = None
-        self.listener: Optional[keyboard.Listener] = None
-        self.buffer = ""
-        self.max_word_len = 0
-        self.words: List[str] = []
+        # Keyboard hook shared by the trigger matcher, emergency hotkey and hotkey test
+        self.input_service = InputService()
+        self._hotkey_test_id = 0  # Only the latest hotkey test reports its result
         self.is_listening = False
-        self.last_shock_time = 0
-        self.shock_count = 0
         self.max_shocks_per_minute = 5
         self.current_platform: Platform = Platform.PISHOCK
-        self.emergency_hotkey = None  # Global emergency stop hotkey
+        self.emergency_hotkey: Optional[keyboard.HotKey] = None  # Global emergency stop hotkey
+        self.profiler: Optional[ProfilingSession] = None
+        
+        # Named profiles (settings dicts); the form edits the active one
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        self.active_profile = DEFAULT_PROFILE
+        # Runtime state of every listening profile, and the matcher shared by all of them
+        self._runtimes: Dict[str, ProfileRuntime] = {}
+        self.matcher = TriggerMatcher([])
+        
+        # Single-producer (keyboard hook thread) / single-consumer (Tk thread)
+        # queue; deque.append and deque.popleft are atomic, so no lock is needed.
+        self._key_events: deque = deque()
+        self._drain_job = None
+        self._pending_confirmations: Dict[str, PendingConfirmation] = {}
+        
+        # Dispatch engine shared by all profiles: pooled HTTP connections and worker threads
+        self.http = requests.Session()
+        self.dispatch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dispatch")
+        # Callbacks queued by dispatch threads (sends, batch flushes, patterns), run on the Tk thread
+        self._dispatch_results: deque = deque()
+        self.openshock_batcher = OpenShockBatcher(self._post_openshock_batch, self._queue_batch_result)
+        
+        # Pulse patterns from the settings file, shared by all profiles
+        self.patterns: Dict[str, List[PatternStep]] = {}
         
         # API endpoints
         self.api_endpoints = {
@@ -56,10 +1439,26 @@ class PiShockUniversalApp:
             Platform.PI3OPEN: "https://pi3open.isso.moe/api/apioperate/"
         }
         
+        # Alternative routes to the same API (e.g. mirrors); the health monitor
+        # picks the fastest healthy one. Extra routes come from the settings file.
+        self.api_routes: Dict[Platform, List[str]] = {
+            platform: [url] for platform, url in self.api_endpoints.items()
+        }
+        self.health_monitor = EndpointHealthMonitor(self.api_routes)
+        # Per-host adaptive throttles, created on first use by any dispatch thread
+        self.throttles: Dict[str, EndpointThrottle] = {}
+        
         # Initialize UI
         self._setup_ui()
         self._load_settings()
         
+        if profiling:
+            self.profiling_var.set(True)
+            self._toggle_profiling()
+        
+        self.health_monitor.start()
+        self._refresh_endpoint_health()
+        
         logger.info("PiShock Universal App initialized")
 
     def _setup_ui(self):
@@ -76,6 +1475,9 @@ class PiShockUniversalApp:
         main_frame = ttk.Frame(self.master)
         main_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
         
+        # Profile section
+        self._create_profile_section(main_frame)
+        
         # Platform selection section
         self._create_platform_section(main_frame)
         
@@ -94,6 +1496,9 @@ class PiShockUniversalApp:
         # Emergency hotkey section
         self._create_emergency_hotkey_section(main_frame)
         
+        # Diagnostics section
+        self._create_diagnostics_section(main_frame)
+        
         # Control section
         self._create_control_section(main_frame)
         
@@ -103,10 +1508,31 @@ class PiShockUniversalApp:
         # Statistics section
         self._create_stats_section(main_frame)
 
+    def _create_profile_section(self, parent):
+        """Create profile selection section."""
+        profile_frame = ttk.LabelFrame(parent, text="Profiles")
+        profile_frame.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+        
+        ttk.Label(profile_frame, text="Profile:").grid(row=0, column=0, sticky="e", padx=5)
+        self.profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.profile_var, width=20, state="readonly")
+        self.profile_combo.grid(row=0, column=1, padx=5, pady=5)
+        self.profile_combo.bind("<<ComboboxSelected>>", self._on_profile_selected)
+        
+        self.new_profile_btn = ttk.Button(profile_frame, text="New", command=self._new_profile)
+        self.new_profile_btn.grid(row=0, column=2, padx=5)
+        self.delete_profile_btn = ttk.Button(profile_frame, text="Delete", command=self._delete_profile)
+        self.delete_profile_btn.grid(row=0, column=3, padx=5)
+        
+        self.profile_enabled_var = tk.BooleanVar(value=False)
+        self.profile_enabled_check = ttk.Checkbutton(profile_frame, text="Also listen with this profile when another is selected",
+                                                     variable=self.profile_enabled_var)
+        self.profile_enabled_check.grid(row=1, column=0, columnspan=4, sticky="w", padx=5, pady=(0, 5))
+
     def _create_platform_section(self, parent):
         """Create platform selection section."""
         platform_frame = ttk.LabelFrame(parent, text="Platform Selection")
-        platform_frame.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+        platform_frame.grid(row=1, column=0, sticky="ew", pady=(0, 10))
         
         self.platform_var = tk.StringVar(value="pishock")
         
@@ -127,7 +1553,7 @@ class PiShockUniversalApp:
     def _create_api_section(self, parent):
         """Create API key input section."""
         api_frame = ttk.LabelFrame(parent, text="API Configuration")
-        api_frame.grid(row=1, column=0, sticky="ew", pady=(0, 10))
+        api_frame.grid(row=2, column=0, sticky="ew", pady=(0, 10))
         
         ttk.Label(api_frame, text="API Key/Token:").grid(row=0, column=0, sticky="e", padx=5)
         self.api_key_var = tk.StringVar()
@@ -139,7 +1565,7 @@ class PiShockUniversalApp:
     def _create_credentials_section(self, parent):
         """Create credentials input section."""
         creds_frame = ttk.LabelFrame(parent, text="Device Credentials")
-        creds_frame.grid(row=2, column=0, sticky="ew", pady=(0, 10))
+        creds_frame.grid(row=3, column=0, sticky="ew", pady=(0, 10))
         
         self.credential_vars = {}
         self.credential_labels = {}
@@ -171,7 +1597,7 @@ class PiShockUniversalApp:
     def _create_settings_section(self, parent):
         """Create trigger settings section."""
         settings_frame = ttk.LabelFrame(parent, text="Trigger Settings")
-        settings_frame.grid(row=2, column=0, sticky="ew", pady=(0, 10))
+        settings_frame.grid(row=3, column=0, sticky="ew", pady=(0, 10))
         
         # Configure grid weights for proper resizing
         settings_frame.grid_columnconfigure(1, weight=1)
@@ -181,7 +1607,7 @@ class PiShockUniversalApp:
         self.words_var = tk.StringVar()
         self.words_entry = ttk.Entry(settings_frame, textvariable=self.words_var, width=40)
         self.words_entry.grid(row=0, column=1, sticky="ew", padx=5, pady=5)
-        ttk.Label(settings_frame, text="(comma-separated)", font=("TkDefaultFont", 8)).grid(row=1, column=1, sticky="w", padx=5, pady=(0, 5))
+        ttk.Label(settings_frame, text="(comma-separated; word=pattern runs a pulse pattern)", font=("TkDefaultFont", 8)).grid(row=1, column=1, sticky="w", padx=5, pady=(0, 5))
         
         # Duration and Intensity
         ttk.Label(settings_frame, text="Duration (1-15s):").grid(row=2, column=0, sticky="e", padx=5, pady=5)
@@ -193,11 +1619,17 @@ class PiShockUniversalApp:
         self.intensity_var = tk.StringVar(value="10")
         self.intensity_spin = ttk.Spinbox(settings_frame, from_=1, to=100, textvariable=self.intensity_var, width=5)
         self.intensity_spin.grid(row=3, column=1, sticky="w", padx=5, pady=5)
+        
+        # OpenShock batching
+        self.batching_var = tk.BooleanVar(value=False)
+        self.batching_check = ttk.Checkbutton(settings_frame, text="Batch OpenShock commands (comma-separate multiple shocker IDs)",
+                                              variable=self.batching_var)
+        self.batching_check.grid(row=4, column=0, columnspan=2, sticky="w", padx=5, pady=5)
 
     def _create_safety_section(self, parent):
         """Create safety settings section."""
         safety_frame = ttk.LabelFrame(parent, text="Safety Settings")
-        safety_frame.grid(row=3, column=0, sticky="ew", pady=(0, 10))
+        safety_frame.grid(row=4, column=0, sticky="ew", pady=(0, 10))
         
         # Configure grid weights for proper resizing
         safety_frame.grid_columnconfigure(1, weight=1)
@@ -223,76 +1655,42 @@ class PiShockUniversalApp:
         """Test the emergency hotkey functionality."""
         hotkey = self.hotkey_var.get()
         try:
-            # Parse the hotkey
-            keys = hotkey.split('+')
-            if len(keys) == 1:
-                # Single key
-                key = keys[0].strip()
-                if key == 'f12':
-                    key_obj = keyboard.Key.f12
-                else:
-                    key_obj = key
-            else:
-                # Combination key
-                modifiers = []
-                main_key = keys[-1].strip()
-                
-                for mod in keys[:-1]:
-                    mod = mod.strip().lower()
-                    if mod == 'ctrl':
-                        modifiers.append(keyboard.Key.ctrl)
-                    elif mod == 'alt':
-                        modifiers.append(keyboard.Key.alt)
-                    elif mod == 'shift':
-                        modifiers.append(keyboard.Key.shift)
-                
-                if main_key == 'esc':
-                    key_obj = keyboard.Key.esc
-                elif main_key == 'space':
-                    key_obj = keyboard.Key.space
-                elif main_key == 'f12':
-                    key_obj = keyboard.Key.f12
-                else:
-                    key_obj = main_key
-                
-                # Create hotkey combination
-                if modifiers:
-                    key_obj = tuple(modifiers + [key_obj])
-            
-            # Test the hotkey
-            self.hotkey_status_var.set("Testing hotkey... Press it now!")
-            self.hotkey_status_label.config(foreground="orange")
-            
-            def on_hotkey_press():
-                self.master.after(0, lambda: self.hotkey_status_var.set("✅ Hotkey working!"))
-                self.master.after(0, lambda: self.hotkey_status_label.config(foreground="green"))
-                return False  # Stop the listener
-            
-            # Start temporary listener
-            temp_listener = keyboard.GlobalHotKeys({hotkey: on_hotkey_press})
-            temp_listener.start()
-            
-            # Stop after 5 seconds
-            self.master.after(5000, lambda: self._stop_hotkey_test(temp_listener))
-            
+            pressed = threading.Event()
+            test_hotkey = keyboard.HotKey(keyboard.HotKey.parse(self._hotkey_spec(hotkey)), pressed.set)
         except Exception as e:
             self.hotkey_status_var.set(f"❌ Error: {str(e)}")
             self.hotkey_status_label.config(foreground="red")
+            return
+        
+        # Listen on the shared hook for up to 5 seconds. Each test has its own
+        # subscription, so a test that times out can't remove a newer one
+        self._hotkey_test_id += 1
+        test_id = self._hotkey_test_id
+        self.input_service.subscribe(f"hotkey-test-{test_id}", *self._hotkey_callbacks(test_hotkey))
+        self.hotkey_status_var.set("Testing hotkey... Press it now!")
+        self.hotkey_status_label.config(foreground="orange")
+        self._poll_hotkey_test(test_id, pressed, time.monotonic() + 5)
 
-    def _stop_hotkey_test(self, listener):
-        """Stop the hotkey test listener."""
-        try:
-            listener.stop()
-            if self.hotkey_status_var.get() == "Testing hotkey... Press it now!":
-                self.hotkey_status_var.set("❌ Test timeout - try again")
-                self.hotkey_status_label.config(foreground="red")
-        except:
-            pass
+    def _poll_hotkey_test(self, test_id: int, pressed: threading.Event, deadline: float):
+        """Check the hotkey test from the Tk thread until it passes or times out."""
+        if not pressed.is_set() and time.monotonic() < deadline:
+            self.master.after(100, self._poll_hotkey_test, test_id, pressed, deadline)
+            return
+        
+        self.input_service.unsubscribe(f"hotkey-test-{test_id}")
+        if test_id != self._hotkey_test_id:
+            return  # Superseded by a newer test
+        if pressed.is_set():
+            self.hotkey_status_var.set("✅ Hotkey working!")
+            self.hotkey_status_label.config(foreground="green")
+        else:
+            self.hotkey_status_var.set("❌ Test timeout - try again")
+            self.hotkey_status_label.config(foreground="red")
 
     def _create_emergency_hotkey_section(self, parent):
         """Create emergency hotkey settings section."""
         hotkey_frame = ttk.LabelFrame(parent, text="Emergency Hotkey")
-        hotkey_frame.grid(row=4, column=0, sticky="ew", pady=(0, 10))
+        hotkey_frame.grid(row=5, column=0, sticky="ew", pady=(0, 10))
         
         # Configure grid weights for proper resizing
         hotkey_frame.grid_columnconfigure(1, weight=1)
@@ -320,10 +1718,48 @@ class PiShockUniversalApp:
         self.hotkey_status_label = ttk.Label(hotkey_frame, textvariable=self.hotkey_status_var, foreground="orange", wraplength=500)
         self.hotkey_status_label.grid(row=1, column=0, columnspan=3, sticky="ew", padx=5, pady=(0, 5))
 
+    def _create_diagnostics_section(self, parent):
+        """Create diagnostics (profiling) section."""
+        diag_frame = ttk.LabelFrame(parent, text="Diagnostics")
+        diag_frame.grid(row=6, column=0, sticky="ew", pady=(0, 10))
+        
+        self.profiling_var = tk.BooleanVar(value=False)
+        self.profiling_check = ttk.Checkbutton(diag_frame, text="Enable profiling", 
+                                               variable=self.profiling_var, command=self._toggle_profiling)
+        self.profiling_check.grid(row=0, column=0, sticky="w", padx=5, pady=5)
+        
+        ttk.Button(diag_frame, text="Dump Profile", command=self._dump_profile).grid(row=0, column=1, padx=5, pady=5)
+
+    def _toggle_profiling(self):
+        """Start or stop the profiler from the diagnostics checkbox."""
+        if self.profiling_var.get():
+            if self.profiler is None:
+                self.profiler = ProfilingSession()
+                self.profiler.start(self)
+                self.status_var.set("Profiling enabled")
+                logger.info("Profiling enabled")
+        elif self.profiler is not None:
+            self._dump_profile()
+            self.profiler.stop(self)
+            self.profiler = None
+            logger.info("Profiling disabled")
+
+    def _dump_profile(self):
+        """Write the current profile to disk."""
+        if self.profiler is None:
+            self.status_var.set("Profiling is not enabled")
+            return
+        try:
+            folded_path, stats_path = self.profiler.dump()
+            self.status_var.set(f"Profile saved: {folded_path.name}, {stats_path.name}")
+        except Exception as e:
+            self.status_var.set(f"Failed to save profile: {e}")
+            logger.error(f"Failed to save profile: {e}")
+
     def _create_control_section(self, parent):
         """Create control buttons section."""
         control_frame = ttk.Frame(parent)
-        control_frame.grid(row=6, column=0, pady=10)
+        control_frame.grid(row=7, column=0, pady=10)
         
         self.start_btn = ttk.Button(control_frame, text="Start Listening", command=self.start_listening)
         self.start_btn.grid(row=0, column=0, padx=5)
@@ -342,7 +1778,7 @@ class PiShockUniversalApp:
     def _create_status_section(self, parent):
         """Create status display section."""
         status_frame = ttk.LabelFrame(parent, text="Status")
-        status_frame.grid(row=7, column=0, sticky="ew", pady=(0, 10))
+        status_frame.grid(row=8, column=0, sticky="ew", pady=(0, 10))
         
         self.status_var = tk.StringVar(value="Ready - Select platform and enter credentials")
         self.status_label = ttk.Label(status_frame, textvariable=self.status_var, wraplength=500)
@@ -355,7 +1791,7 @@ class PiShockUniversalApp:
     def _create_stats_section(self, parent):
         """Create statistics section."""
         stats_frame = ttk.LabelFrame(parent, text="Statistics")
-        stats_frame.grid(row=8, column=0, sticky="ew", pady=(0, 10))
+        stats_frame.grid(row=9, column=0, sticky="ew", pady=(0, 10))
         
         self.stats_text = tk.Text(stats_frame, height=4, width=60, state="disabled")
         self.stats_text.grid(row=0, column=0, padx=5, pady=5)
@@ -391,35 +1827,145 @@ class PiShockUniversalApp:
         else:
             self.credential_labels["device_id"] = "Share Code/Device ID"
 
+    @staticmethod
+    def _spin_value(var):
+        """Return a spinbox value as int where possible (invalid text is kept for validation)."""
+        try:
+            return int(var.get())
+        except ValueError:
+            return var.get()
+
+    def _form_settings(self) -> Dict[str, Any]:
+        """Return the form's current values as a profile settings dict."""
+        values = {
+            'platform': self.platform_var.get(),
+            'api_key': self.api_key_var.get(),
+            'words': self.words_var.get(),
+            'duration': self._spin_value(self.duration_var),
+            'intensity': self._spin_value(self.intensity_var),
+            'cooldown': self._spin_value(self.cooldown_var),
+            'max_shocks': self._spin_value(self.max_shocks_var),
+            'openshock_batching': self.batching_var.get(),
+            'enabled': self.profile_enabled_var.get()
+        }
+        for key, var in self.credential_vars.items():
+            values[key] = var.get()
+        return values
+
+    def _apply_profile_settings(self, values: Dict[str, Any]):
+        """Load a profile settings dict into the form."""
+        if 'platform' in values:
+            self.platform_var.set(values['platform'])
+            self._on_platform_change()
+        if 'api_key' in values:
+            self.api_key_var.set(values['api_key'])
+        for key, var in self.credential_vars.items():
+            if key in values:
+                var.set(values[key])
+        if 'words' in values:
+            self.words_var.set(values['words'])
+        if 'duration' in values:
+            self.duration_var.set(str(values['duration']))
+        if 'intensity' in values:
+            self.intensity_var.set(str(values['intensity']))
+        if 'cooldown' in values:
+            self.cooldown_var.set(str(values['cooldown']))
+        if 'max_shocks' in values:
+            self.max_shocks_var.set(str(values['max_shocks']))
+        if 'openshock_batching' in values:
+            self.batching_var.set(values['openshock_batching'])
+        self.profile_enabled_var.set(values.get('enabled', False))
+
+    def _refresh_profile_choices(self):
+        self.profile_combo['values'] = list(self.profiles)
+        self.profile_var.set(self.active_profile)
+
+    def _switch_profile(self, name: str):
+        """Store the form into the active profile and load another one."""
+        self.profiles[self.active_profile] = self._form_settings()
+        self.active_profile = name
+        self._apply_profile_settings(self.profiles[name])
+        self._refresh_profile_choices()
+        # A tested key only carries over if the new profile uses the same one
+        if self.api_key != self.api_key_var.get():
+            self.api_key = None
+        self.status_var.set(f"Profile changed to {name}")
+
+    def _on_profile_selected(self, event=None):
+        """Handle profile selection change."""
+        name = self.profile_var.get()
+        if name != self.active_profile:
+            self._switch_profile(name)
+
+    def _new_profile(self):
+        """Create a profile, starting from a copy of the current form."""
+        name = simpledialog.askstring("New Profile", "Profile name:", parent=self.master)
+        if name is None:
+            return
+        name = name.strip()
+        if not name or name in self.profiles:
+            messagebox.showerror("Error", "Please enter a new, unique profile name")
+            return
+        
+        self.profiles[name] = dict(self._form_settings(), enabled=False)
+        self._switch_profile(name)
+        logger.info(f"Created profile '{name}'")
+
+    def _delete_profile(self):
+        """Delete the selected profile."""
+        if len(self.profiles) == 1:
+            messagebox.showerror("Error", "The last profile cannot be deleted")
+            return
+        name = self.active_profile
+        if not messagebox.askyesno("Delete Profile", f"Delete profile '{name}'?"):
+            return
+        
+        del self.profiles[name]
+        self.active_profile = next(iter(self.profiles))
+        self._apply_profile_settings(self.profiles[self.active_profile])
+        self._refresh_profile_choices()
+        self.status_var.set(f"Deleted profile {name}")
+        logger.info(f"Deleted profile '{name}'")
+
     def _validate_inputs(self) -> bool:
         """Validate all user inputs."""
+        errors = self._validate_settings(self._form_settings())
+        
+        if errors:
+            messagebox.showerror("Validation Error", "\n".join(errors))
+            return False
+        
+        return True
+
+    def _validate_settings(self, values: Dict[str, Any]) -> List[str]:
+        """Validate a profile settings dict, returning error messages."""
         errors = []
         
         # Validate API key
-        api_key = self.api_key_var.get().strip()
+        api_key = values['api_key'].strip()
         if not api_key:
             errors.append("API key/token is required")
         elif not re.match(r'^[a-zA-Z0-9_-]+$', api_key):
             errors.append("API key contains invalid characters")
         
         # Validate credentials based on platform
-        platform = self.platform_var.get()
+        platform = values['platform']
         
         if platform == "openshock":
             # OpenShock only needs Device ID
-            device_id = self.credential_vars["device_id"].get().strip()
+            device_id = values["device_id"].strip()
             if not device_id:
                 errors.append("Device ID is required for OpenShock")
         else:
             # PiShock and pi3open need all credentials
-            for key, var in self.credential_vars.items():
-                value = var.get().strip()
+            for key in self.credential_vars:
+                value = values[key].strip()
                 if not value:
                     errors.append(f"{self.credential_labels[key]} is required")
         
         # Validate duration
         try:
-            duration = int(self.duration_var.get())
+            duration = int(values['duration'])
             if not 1 <= duration <= 15:
                 errors.append("Duration must be between 1 and 15 seconds")
         except ValueError:
@@ -427,36 +1973,55 @@ class PiShockUniversalApp:
         
         # Validate intensity
         try:
-            intensity = int(self.intensity_var.get())
+            intensity = int(values['intensity'])
             if not 1 <= intensity <= 100:
                 errors.append("Intensity must be between 1 and 100")
         except ValueError:
             errors.append("Intensity must be a valid number")
         
         # Validate trigger words
-        words_text = self.words_var.get().strip()
+        words_text = values['words'].strip()
         if not words_text:
             errors.append("At least one trigger word is required")
         else:
-            words = [w.strip() for w in words_text.split(",") if w.strip()]
+            words = self._parse_trigger_words(words_text)
             if not words:
                 errors.append("At least one valid trigger word is required")
             elif len(words) > 10:
                 errors.append("Maximum 10 trigger words allowed")
+            for word, pattern in words:
+                if not word:
+                    errors.append("Trigger word missing before '='")
+                elif pattern is not None and pattern not in self.patterns:
+                    errors.append(f"Unknown pattern '{pattern}' for trigger word '{word}'")
         
         # Validate cooldown
         try:
-            cooldown = int(self.cooldown_var.get())
+            cooldown = int(values['cooldown'])
             if not 0 <= cooldown <= 60:
                 errors.append("Cooldown must be between 0 and 60 seconds")
         except ValueError:
             errors.append("Cooldown must be a valid number")
         
-        if errors:
-            messagebox.showerror("Validation Error", "\n".join(errors))
-            return False
+        # Validate max shocks; the shared ledger keeps SafetyLedger.RING shock times per device
+        try:
+            max_shocks = int(values['max_shocks'])
+            if not 1 <= max_shocks <= SafetyLedger.RING:
+                errors.append(f"Max shocks must be between 1 and {SafetyLedger.RING} per minute")
+        except ValueError:
+            errors.append("Max shocks must be a valid number")
         
-        return True
+        return errors
+
+    @staticmethod
+    def _parse_trigger_words(words_text: str) -> List[tuple[str, Optional[str]]]:
+        """Split 'word, word=pattern' text into (word, pattern name or None) pairs."""
+        words = []
+        for item in words_text.split(","):
+            word, sep, pattern = item.partition("=")
+            if item.strip():
+                words.append((word.strip(), pattern.strip() if sep else None))
+        return words
 
     def _test_api_connection(self):
         """Test API connection with current credentials."""
@@ -503,8 +2068,7 @@ class PiShockUniversalApp:
             "Intensity": "1"
         }
         
-        response = requests.post(self.api_endpoints[Platform.PISHOCK], json=payload, timeout=10)
-        response.raise_for_status()
+        self._post(self._route_for(Platform.PISHOCK), json=payload)
         return True, "PiShock connection successful!"
 
     def _test_openshock(self) -> tuple[bool, str]:
@@ -522,8 +2086,7 @@ class PiShockUniversalApp:
             "duration": 1000  # OpenShock uses milliseconds
         }
         
-        response = requests.post(self.api_endpoints[Platform.OPENSHOCK], json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
+        self._post(self._route_for(Platform.OPENSHOCK), json=payload, headers=headers)
         return True, "OpenShock connection successful!"
 
     def _test_pi3open(self) -> tuple[bool, str]:
@@ -538,10 +2101,67 @@ class PiShockUniversalApp:
             "Intensity": "1"
         }
         
-        response = requests.post(self.api_endpoints[Platform.PI3OPEN], json=payload, timeout=10)
-        response.raise_for_status()
+        self._post(self._route_for(Platform.PI3OPEN), json=payload)
         return True, "pi3open connection successful!"
 
+    def _route_for(self, platform: Platform) -> str:
+        """Return the endpoint URL to use for a platform."""
+        return self.health_monitor.best_route(platform)
+
+    def _throttle_for(self, url: str) -> EndpointThrottle:
+        host = urlsplit(url).netloc
+        throttle = self.throttles.get(host)
+        if throttle is None:
+            throttle = self.throttles.setdefault(host, EndpointThrottle(clock=self.clock))
+        return throttle
+
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """POST through the host's adaptive throttle. Safe to call from any thread.
+        
+        Raises ThrottledError without sending when the host's budget is spent,
+        and for 429 responses, so callers report a clear reason.
+        """
+        throttle = self._throttle_for(url)
+        reason = throttle.acquire()
+        if reason:
+            raise ThrottledError(reason)
+        
+        started = time.perf_counter()
+        try:
+            response = self.http.post(url, timeout=10, **kwargs)
+        except requests.RequestException:
+            throttle.release(None, time.perf_counter() - started)
+            raise
+        
+        retry_after = parse_retry_after(response.headers)
+        throttle.release(response.status_code, time.perf_counter() - started, retry_after)
+        if response.status_code == 429:
+            wait = f" - retry in {retry_after:.0f}s" if retry_after is not None else ""
+            raise ThrottledError(f"Rate limited by server (HTTP 429){wait}")
+        response.raise_for_status()
+        return response
+
+    def _endpoint_health_summary(self) -> str:
+        """Describe the health of the selected platform's current route."""
+        platform = Platform(self.platform_var.get())
+        url = self._route_for(platform)
+        url_stats = self.health_monitor.stats(url)
+        host = urlsplit(url).hostname
+        if not url_stats["probes"]:
+            return f"{host} (not probed yet)"
+        if url_stats["avg_rtt"] is None:
+            return f"{host} (unreachable)"
+        return (f"{host} ({url_stats['avg_rtt'] * 1000:.0f}ms avg, "
+                f"{url_stats['availability']:.0%} up, {len(self.api_routes[platform])} route(s))")
+
+    def _refresh_endpoint_health(self):
+        """Periodically refresh the statistics panel with endpoint health."""
+        try:
+            self._drain_dispatch_results()
+            self._update_statistics()
+        finally:
+            self.master.after(5000, self._refresh_endpoint_health)
+
     def _connection_test_result(self, success: bool, message: str):
         """Handle API connection test result."""
         self.progress.stop()
@@ -553,147 +2173,331 @@ class PiShockUniversalApp:
             self.status_var.set(f"✗ {message}")
             logger.error(f"API connection test failed: {message}")
 
-    def _confirm_shock(self) -> bool:
-        """Show confirmation dialog before shock."""
-        if not self.confirmation_var.get():
-            return True
+    def _status(self, runtime: ProfileRuntime, text: str):
+        """Set a shock-related status, naming the profile when several are listening."""
+        if len(self._runtimes) > 1:
+            text = f"[{runtime.name}] {text}"
+        self.status_var.set(text)
+
+    def _request_confirmation(self, runtime: ProfileRuntime, pattern: Optional[str] = None):
+        """Show a non-modal confirmation prompt that expires after a timeout.
+        
+        Further matches for the same profile while its prompt is open collapse
+        into it instead of opening more prompts.
+        """
+        pending = self._pending_confirmations.get(runtime.name)
+        if pending is not None:
+            pending.triggers += 1
+            self._update_confirmation_countdown(runtime.name)
+            return
         
-        platform = self.platform_var.get().title()
-        result = messagebox.askyesno(
-            "Confirm Shock",
-            f"Are you sure you want to trigger a shock via {platform}?\n\n"
-            f"Duration: {self.duration_var.get()}s\n"
-            f"Intensity: {self.intensity_var.get()}\n\n"
-            "Click 'Yes' to proceed or 'No' to cancel."
-        )
-        return result
+        config = runtime.config
+        window = tk.Toplevel(self.master)
+        window.title(f"Confirm Shock - {runtime.name}" if len(self._runtimes) > 1 else "Confirm Shock")
+        window.transient(self.master)
+        window.resizable(False, False)
+        window.protocol("WM_DELETE_WINDOW", lambda: self._resolve_confirmation(runtime.name, False))
+        
+        pending = PendingConfirmation(window, self.clock() + CONFIRMATION_TIMEOUT, runtime, pattern)
+        self._pending_confirmations[runtime.name] = pending
+        
+        if pattern is None:
+            prompt = (f"Are you sure you want to trigger a shock via {config.platform.value.title()}?\n\n"
+                      f"Duration: {config.duration}s\n"
+                      f"Intensity: {config.intensity}")
+        else:
+            prompt = (f"Are you sure you want to run pattern '{pattern}' via {config.platform.value.title()}?\n\n"
+                      f"Steps: {len(self.patterns[pattern])}\n"
+                      f"Max intensity: {config.intensity}")
+        ttk.Label(window, text=prompt).grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+        ttk.Label(window, textvariable=pending.countdown_var, foreground="orange").grid(
+            row=1, column=0, columnspan=2, padx=10)
+        ttk.Button(window, text="Yes", command=lambda: self._resolve_confirmation(runtime.name, True)).grid(
+            row=2, column=0, padx=10, pady=10)
+        ttk.Button(window, text="No", command=lambda: self._resolve_confirmation(runtime.name, False)).grid(
+            row=2, column=1, padx=10, pady=10)
+        
+        self._status(runtime, "Waiting for shock confirmation...")
+        self._update_confirmation_countdown(runtime.name)
 
-    def _check_safety_limits(self) -> bool:
-        """Check if shock is within safety limits."""
-        current_time = time.time()
+    def _update_confirmation_countdown(self, name: str):
+        """Refresh the countdown and expire the prompt once its deadline passes."""
+        pending = self._pending_confirmations.get(name)
+        if pending is None:
+            return
         
-        # Check cooldown
-        cooldown = int(self.cooldown_var.get())
-        if current_time - self.last_shock_time < cooldown:
-            remaining = cooldown - (current_time - self.last_shock_time)
-            self.status_var.set(f"Cooldown active - {remaining:.1f}s remaining")
-            return False
+        remaining = pending.deadline - self.clock()
+        if remaining <= 0:
+            self._cancel_confirmation(name, "Confirmation timed out - shock cancelled")
+            return
         
-        # Check rate limit
-        max_shocks = int(self.max_shocks_var.get())
-        if self.shock_count >= max_shocks:
-            self.status_var.set("Rate limit reached - too many shocks")
-            return False
+        text = f"Expires in {remaining:.0f}s"
+        if pending.triggers > 1:
+            text += f" ({pending.triggers} triggers)"
+        pending.countdown_var.set(text)
         
-        return True
+        if pending.job is not None:
+            self.master.after_cancel(pending.job)
+        pending.job = self.master.after(250, self._update_confirmation_countdown, name)
 
-    def shock(self):
-        """Send shock command with enhanced safety checks."""
-        if not self._check_safety_limits():
+    def _resolve_confirmation(self, name: str, confirmed: bool):
+        """Handle the user's answer to a pending confirmation."""
+        pending = self._pending_confirmations.get(name)
+        if pending is None:
             return
         
-        if not self._confirm_shock():
-            self.status_var.set("Shock cancelled by user")
+        expired = self.clock() >= pending.deadline
+        runtime = pending.runtime
+        self._close_confirmation(name)
+        
+        if not confirmed:
+            self._status(runtime, "Shock cancelled by user")
+        elif expired or not self.is_listening:
+            self._status(runtime, "Confirmation no longer valid - shock cancelled")
+        else:
+            # Delivery takes the safety budget atomically, so limits that changed
+            # while waiting (here or in another process) still apply
+            self._deliver_shock(runtime, pending.pattern)
+
+    def _cancel_confirmation(self, name: str, reason: str):
+        """Discard a pending confirmation without shocking."""
+        pending = self._pending_confirmations.get(name)
+        if pending is None:
+            return
+        self._close_confirmation(name)
+        self._status(pending.runtime, reason)
+        logger.info(reason)
+
+    def _close_confirmation(self, name: str):
+        pending = self._pending_confirmations.pop(name)
+        if pending.job is not None:
+            self.master.after_cancel(pending.job)
+        pending.window.destroy()
+
+    def _check_safety_limits(self, runtime: ProfileRuntime) -> Optional[str]:
+        """Check if shock is within the profile's safety limits; returns the reason if not."""
+        reason = runtime.safety.check(runtime.cooldown, runtime.max_shocks)
+        if reason:
+            self._status(runtime, reason)
+        return reason
+
+    def shock(self, profile: str, word: Optional[str] = None):
+        """Send shock command (or the word's pattern) with enhanced safety checks."""
+        runtime = self._runtimes[profile]
+        reason = self._check_safety_limits(runtime)
+        if self.trace_recorder is not None:
+            self.trace_recorder.outcome(profile, reason is None, isinstance(reason, SharedLimitReason))
+        if reason:
             return
         
-        platform = Platform(self.platform_var.get())
+        pattern = runtime.word_patterns.get(word)
+        if self.confirmation_var.get():
+            self._request_confirmation(runtime, pattern)
+            return
         
-        try:
-            self.status_var.set(f"Sending shock command via {platform.value}...")
-            success, message = self._send_shock_command(platform)
-            
-            if success:
-                # Update statistics
-                self.last_shock_time = time.time()
-                self.shock_count += 1
-                
-                self.status_var.set(f"Shock delivered via {platform.value}! ({self.shock_count} total)")
-                self._update_statistics()
-                
-                logger.info(f"Shock delivered via {platform.value} - Duration: {self.duration_var.get()}s, Intensity: {self.intensity_var.get()}")
-            else:
-                self.status_var.set(f"Shock failed: {message}")
-                logger.error(f"Shock failed via {platform.value}: {message}")
-                
-        except Exception as e:
-            error_msg = f"Shock failed: {str(e)}"
-            self.status_var.set(error_msg)
-            logger.error(error_msg)
+        self._deliver_shock(runtime, pattern)
 
-    def _send_shock_command(self, platform: Platform) -> tuple[bool, str]:
-        """Send shock command to the selected platform."""
+    def _deliver_shock(self, runtime: ProfileRuntime, pattern: Optional[str] = None):
+        """Hand the shock command to the dispatch engine."""
+        config = runtime.config
+        
+        if pattern is not None:
+            self._start_pattern(runtime, pattern)
+            return
+        
+        # Dispatch is asynchronous, so the safety budget is taken up front
+        reason = runtime.safety.take(runtime.cooldown, runtime.max_shocks)
+        if reason:
+            self._status(runtime, reason)
+            return
+        if self.trace_recorder is not None:
+            self.trace_recorder.delivery(time.perf_counter(), runtime.name)
+        
+        if config.batch:
+            for device in config.devices:
+                self.openshock_batcher.submit(config, config.control(device))
+            self._status(runtime, f"Shock queued for {len(config.devices)} shocker(s) via openshock "
+                                  f"({runtime.safety.shock_count} total)")
+        else:
+            self._status(runtime, f"Sending shock command via {config.platform.value}...")
+            self.dispatch_pool.submit(self._dispatch_shock, runtime)
+        self._update_statistics()
+
+    def _dispatch_shock(self, runtime: ProfileRuntime):
+        """Send a shock to every device of a profile. Runs on a dispatch thread."""
+        config = runtime.config
+        results = [self._send_shock_command(config, device=device) for device in config.devices]
+        failures = [message for success, message in results if not success]
+        self._dispatch_results.append(functools.partial(self._report_shock_result, runtime, len(results), failures))
+
+    def _report_shock_result(self, runtime: ProfileRuntime, total: int, failures: List[str]):
+        """Report a dispatched shock's result."""
+        config = runtime.config
+        platform = config.platform
+        
+        if len(failures) < total:
+            self._status(runtime, f"Shock delivered via {platform.value}! ({runtime.safety.shock_count} total)")
+            logger.info(f"Shock delivered via {platform.value} - Duration: {config.duration}s, "
+                        f"Intensity: {config.intensity}, Profile: {runtime.name}")
+        
+        if failures:
+            message = "; ".join(failures)
+            self._status(runtime, f"Shock failed: {message}")
+            logger.error(f"Shock failed via {platform.value}: {message}")
+        
+        self._update_statistics()
+
+    def _post_openshock_batch(self, config: CommandConfig, controls: List[Dict[str, Any]]):
+        """Send several shocker controls in one OpenShock request, raising on failure."""
+        url = urljoin(self._route_for(Platform.OPENSHOCK), "/2/shockers/control")
+        body = json.dumps({"shocks": controls, "customName": "PiShock-Universal-App"}).encode()
+        self._post(url, data=body, headers=config.headers)
+
+    def _send_openshock_batch(self, config: CommandConfig, controls: List[Dict[str, Any]]) -> tuple[bool, str]:
+        """Send several shocker controls in one OpenShock request. Safe to call from any thread."""
         try:
-            if platform == Platform.PISHOCK:
-                return self._send_pishock_command()
-            elif platform == Platform.OPENSHOCK:
-                return self._send_openshock_command()
-            elif platform == Platform.PI3OPEN:
-                return self._send_pi3open_command()
-            else:
-                return False, "Unknown platform"
+            self._post_openshock_batch(config, controls)
+            return True, "OpenShock shock sent successfully"
         except Exception as e:
             return False, str(e)
 
-    def _send_pishock_command(self) -> tuple[bool, str]:
-        """Send shock command to PiShock."""
-        payload = {
-            "Username": self.credential_vars["username"].get(),
-            "Apikey": self.api_key,
-            "Code": self.credential_vars["device_id"].get(),
-            "Name": self.credential_vars["script_name"].get(),
-            "Op": "0",
-            "Duration": self.duration_var.get(),
-            "Intensity": self.intensity_var.get()
-        }
-        
-        response = requests.post(self.api_endpoints[Platform.PISHOCK], json=payload, timeout=10)
-        response.raise_for_status()
-        return True, "PiShock shock sent successfully"
+    def _queue_batch_result(self, device: str, success: bool, message: str):
+        """Hand a per-shocker batch result to the Tk thread."""
+        self._dispatch_results.append(functools.partial(self._report_batch_result, device, success, message))
 
-    def _send_openshock_command(self) -> tuple[bool, str]:
-        """Send shock command to OpenShock."""
-        headers = {
-            "Open-Shock-Token": self.api_key,
-            "User-Agent": "PiShock-Universal-App/1.0",
-            "Content-Type": "application/json"
-        }
+    def _drain_dispatch_results(self):
+        """Run callbacks queued by dispatch threads on the Tk thread."""
+        results = self._dispatch_results
+        for _ in range(len(results)):
+            callback = results.popleft()
+            try:
+                callback()
+            except Exception:
+                logger.exception("Dispatch result callback failed")
+
+    def _report_batch_result(self, device: str, success: bool, message: str):
+        """Report one shocker's batch result."""
+        if success:
+            self.status_var.set(f"Shock delivered via openshock to shocker {device}!")
+            logger.info(f"Shock delivered via openshock (batched) - Shocker: {device}")
+        else:
+            self.status_var.set(f"Shock failed for shocker {device}: {message}")
+            logger.error(f"Shock failed via openshock: shocker {device}: {message}")
+
+    def _start_pattern(self, runtime: ProfileRuntime, name: str):
+        """Start running a pulse pattern on the profile's sequencer thread."""
+        if runtime.sequencer.running:
+            self._status(runtime, f"Pattern already running - '{name}' skipped")
+            return
         
-        payload = {
-            "deviceId": self.credential_vars["device_id"].get(),
-            "type": 0,  # Shock
-            "intensity": int(self.intensity_var.get()),
-            "duration": int(self.duration_var.get()) * 1000  # Convert to milliseconds
-        }
+        config = runtime.config
+        reason = runtime.safety.take(runtime.cooldown, runtime.max_shocks, count=False)
+        if reason:
+            self._status(runtime, reason)
+            return
+        if self.trace_recorder is not None:
+            self.trace_recorder.delivery(time.perf_counter(), runtime.name, counted=False)
         
-        response = requests.post(self.api_endpoints[Platform.OPENSHOCK], json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        return True, "OpenShock shock sent successfully"
+        runtime.sequencer.start(name, self.patterns[name],
+                                functools.partial(self._prepare_pattern_step, config))
+        self._status(runtime, f"Running pattern '{name}' via {config.platform.value}...")
 
-    def _send_pi3open_command(self) -> tuple[bool, str]:
-        """Send shock command via pi3open translation layer."""
-        payload = {
-            "Username": self.credential_vars["username"].get(),
-            "Apikey": self.api_key,
-            "Code": self.credential_vars["device_id"].get(),
-            "Name": self.credential_vars["script_name"].get(),
-            "Op": "0",
-            "Duration": self.duration_var.get(),
-            "Intensity": self.intensity_var.get()
+    def _prepare_pattern_step(self, config: CommandConfig, step: PatternStep):
+        """Pre-render a step's request(s). The configured intensity caps every step."""
+        intensity = min(step.intensity, config.intensity)
+        duration_ms = config.sent_duration_ms(step.duration_ms)
+        if config.batch and len(config.devices) > 1:
+            controls = [config.control(device, intensity, step.duration_ms, step.op) for device in config.devices]
+            return functools.partial(self._send_openshock_batch, config, controls), duration_ms
+        bodies = [config.body(intensity, step.duration_ms, device, step.op) for device in config.devices]
+        return functools.partial(self._post_bodies, config, bodies), duration_ms
+
+    def _allow_pattern_step(self, runtime: ProfileRuntime, step: PatternStep) -> Optional[str]:
+        """Safety check before each pattern step; returns a reason to abort, if any."""
+        if not self.is_listening:
+            return "listening stopped"
+        if step.op != "shock":
+            return None
+        # Steps are spaced by the pattern, so only the per-minute budget applies
+        if runtime.safety.take(0, runtime.max_shocks):
+            return "rate limit reached"
+        return None
+
+    def _queue_pattern_result(self, runtime: ProfileRuntime, name: str, sent: int, total: int,
+                              jitters: List[float], abort_reason: Optional[str]):
+        """Hand a finished pattern's result to the Tk thread."""
+        self._dispatch_results.append(functools.partial(
+            self._report_pattern_result, runtime, name, sent, total, jitters, abort_reason))
+
+    def _report_pattern_result(self, runtime: ProfileRuntime, name: str, sent: int, total: int,
+                               jitters: List[float], abort_reason: Optional[str]):
+        """Report a finished pattern, including step timing jitter."""
+        platform = runtime.config.platform.value
+        jitter = (f"jitter avg {sum(jitters) / len(jitters):.2f}ms, max {max(jitters):.2f}ms"
+                  if jitters else "no steps timed")
+        if abort_reason:
+            self._status(runtime, f"Pattern '{name}' stopped after {sent}/{total} steps: {abort_reason}")
+            logger.warning(f"Pattern '{name}' aborted via {platform} after {sent}/{total} steps: {abort_reason} ({jitter})")
+        else:
+            self._status(runtime, f"Pattern '{name}' delivered via {platform}! ({runtime.safety.shock_count} total)")
+            logger.info(f"Pattern '{name}' delivered via {platform} - Steps: {sent}/{total}, {jitter}")
+        self._update_statistics()
+
+    def _build_command_config(self, values: Dict[str, Any], api_key: str) -> CommandConfig:
+        """Snapshot a profile's command settings into an immutable config."""
+        return CommandConfig(
+            platform=Platform(values['platform']),
+            api_key=api_key,
+            credentials={key: values[key] for key in self.credential_vars},
+            duration=int(values['duration']),
+            intensity=int(values['intensity']),
+            batch=values.get('openshock_batching', False)
+        )
+
+    def _send_shock_command(self, config: CommandConfig, intensity: Optional[int] = None,
+                            duration_ms: Optional[int] = None, device: Optional[str] = None,
+                            op: Optional[str] = None) -> tuple[bool, str]:
+        """Send a shock command using a captured config. Safe to call from any thread."""
+        platform_names = {
+            Platform.PISHOCK: "PiShock",
+            Platform.OPENSHOCK: "OpenShock",
+            Platform.PI3OPEN: "pi3open"
         }
-        
-        response = requests.post(self.api_endpoints[Platform.PI3OPEN], json=payload, timeout=10)
-        response.raise_for_status()
-        return True, "pi3open shock sent successfully"
+        try:
+            self._post(self._route_for(config.platform), data=config.body(intensity, duration_ms, device, op),
+                       headers=config.headers)
+            return True, f"{platform_names[config.platform]} shock sent successfully"
+        except Exception as e:
+            return False, str(e)
+
+    def _post_bodies(self, config: CommandConfig, bodies: List[bytes]) -> tuple[bool, str]:
+        """Post pre-rendered command bodies in order, stopping at the first failure."""
+        for body in bodies:
+            try:
+                self._post(self._route_for(config.platform), data=body, headers=config.headers)
+            except Exception as e:
+                return False, str(e)
+        return True, "Step sent successfully"
 
     def _update_statistics(self):
         """Update the statistics display."""
         platform = self.platform_var.get().title()
+        runtimes = list(self._runtimes.values())
+        shock_count = sum(runtime.safety.shock_count for runtime in runtimes)
+        # The limiters run on a monotonic clock; convert back to wall time for display
+        since_last = [runtime.safety.seconds_since_last_shock() for runtime in runtimes]
+        since_last = [seconds for seconds in since_last if seconds is not None]
+        last_shock = datetime.fromtimestamp(time.time() - min(since_last)).strftime('%H:%M:%S') if since_last else 'Never'
         stats = f"""Platform: {platform}
-Shocks Today: {self.shock_count}
-Last Shock: {datetime.fromtimestamp(self.last_shock_time).strftime('%H:%M:%S') if self.last_shock_time else 'Never'}
+Shocks Today: {shock_count}
+Last Shock: {last_shock}
 Listening: {'Yes' if self.is_listening else 'No'}
 Cooldown: {self.cooldown_var.get()}s
-Max/Min: {self.max_shocks_var.get()}/min"""
+Max/Min: {self.max_shocks_var.get()}/min
+Endpoint: {self._endpoint_health_summary()}
+Send rate: {self._throttle_for(self._route_for(Platform(self.platform_var.get()))).summary()}"""
+        if len(runtimes) > 1:
+            stats += "\nProfiles: " + ", ".join(f"{runtime.name} ({runtime.safety.shock_count})" for runtime in runtimes)
         
         self.stats_text.config(state="normal")
         self.stats_text.delete(1.0, tk.END)
@@ -701,24 +2505,55 @@ Max/Min: {self.max_shocks_var.get()}/min"""
         self.stats_text.config(state="disabled")
 
     def on_press(self, key):
-        """Enhanced key press handler with safety checks."""
-        if not self.is_listening:
-            return
+        """Keyboard hook callback: enqueue the timestamped key and return immediately.
         
-        try:
-            ch = key.char
-        except AttributeError:
+        Runs on pynput's hook thread, so it must stay O(1) and never touch Tk.
+        """
+        if not self.is_listening:
             return
         
-        self.buffer += ch
-        if len(self.buffer) > self.max_word_len:
-            self.buffer = self.buffer[-self.max_word_len:]
+        ch = getattr(key, "char", None)
+        if ch:
+            self._key_events.append((time.perf_counter(), ch))
+        elif self.trace_recorder is not None:
+            # Special keys only matter to the trace
+            self._key_events.append((time.perf_counter(), key))
+
+    def _drain_key_events(self):
+        """Process queued key events in a batch on the Tk thread.
         
-        for word in self.words:
-            if self.buffer.lower().endswith(word.lower()):
-                self.master.after(0, self.shock)
-                self.buffer = ""
-                break
+        A failing event is logged and skipped; the drain always reschedules,
+        so triggers keep working while the UI says "Listening".
+        """
+        try:
+            self._drain_dispatch_results()
+            
+            events = self._key_events
+            feed = self.matcher.feed
+            recorder = self.trace_recorder
+            for _ in range(len(events)):
+                if not self.is_listening:
+                    break
+                stamp, key = events.popleft()
+                try:
+                    if recorder is not None:
+                        recorder.key(stamp, key)
+                        if not isinstance(key, str):
+                            continue
+                    for profile, word in feed(key):
+                        if recorder is not None:
+                            recorder.match(profile, word)
+                        self.shock(profile, word)
+                except Exception:
+                    logger.exception("Failed to process key event")
+        finally:
+            if self.is_listening:
+                self._drain_job = self.master.after(KEY_POLL_MS, self._drain_key_events)
+
+    def _listening_profiles(self) -> List[str]:
+        """Return the profiles to listen with: the selected one plus enabled others."""
+        return [self.active_profile] + [name for name, values in self.profiles.items()
+                                        if name != self.active_profile and values.get('enabled')]
 
     def start_listening(self):
         """Start listening with enhanced validation."""
@@ -729,14 +2564,41 @@ Max/Min: {self.max_shocks_var.get()}/min"""
             messagebox.showerror("Error", "Please test API connection first")
             return
         
-        # Parse trigger words
-        words_text = self.words_var.get().strip()
-        self.words = [w.strip() for w in words_text.split(",") if w.strip()]
-        self.max_word_len = max(len(w) for w in self.words)
+        self.profiles[self.active_profile] = self._form_settings()
+        names = self._listening_profiles()
+        errors = []
+        for name in names[1:]:
+            errors.extend(f"Profile '{name}': {error}" for error in self._validate_settings(self.profiles[name]))
+        if errors:
+            messagebox.showerror("Validation Error", "\n".join(errors))
+            return
         
-        # Reset statistics
-        self.shock_count = 0
-        self.last_shock_time = 0
+        # Freeze each profile's settings so the hot path never reads Tk variables
+        self._runtimes = {}
+        tagged_words = []
+        for name in names:
+            values = self.profiles[name]
+            api_key = self.api_key if name == self.active_profile else values['api_key']
+            trigger_words = self._parse_trigger_words(values['words'].strip())
+            runtime = ProfileRuntime(
+                name, self._build_command_config(values, api_key),
+                int(values['cooldown']), int(values['max_shocks']),
+                {word.lower(): pattern for word, pattern in trigger_words if pattern is not None},
+                self.clock, self.safety_ledger
+            )
+            runtime.sequencer = PatternSequencer(functools.partial(self._allow_pattern_step, runtime),
+                                                 functools.partial(self._queue_pattern_result, runtime))
+            self._runtimes[name] = runtime
+            tagged_words.extend((word, name) for word, _ in trigger_words)
+        
+        # One matcher pass per key serves every profile
+        self.matcher = TriggerMatcher(tagged_words)
+        self._key_events.clear()
+        if self.trace_recorder is not None:
+            self.trace_recorder.start([
+                (name, runtime.cooldown, runtime.max_shocks, [word for word, profile in tagged_words if profile == name])
+                for name, runtime in self._runtimes.items()
+            ])
         
         # Update UI
         self.is_listening = True
@@ -744,28 +2606,50 @@ Max/Min: {self.max_shocks_var.get()}/min"""
         self.stop_btn.config(state="normal")
         self.emergency_btn.config(state="normal")
         
-        # Disable input fields
-        for widget in [self.words_entry, self.duration_spin, self.intensity_spin]:
+        # Disable input fields (profiling wraps on_press, which is subscribed at start)
+        for widget in self._locked_while_listening():
             widget.config(state="disabled")
         
         platform = self.platform_var.get().title()
-        self.status_var.set(f"Listening for trigger words via {platform}...")
+        if len(names) > 1:
+            self.status_var.set(f"Listening for trigger words with {len(names)} profiles...")
+        else:
+            self.status_var.set(f"Listening for trigger words via {platform}...")
         self._update_statistics()
         
-        # Start keyboard listener
-        self.listener = keyboard.Listener(on_press=self.on_press)
-        self.listener.start()
+        # Feed the shared keyboard hook into the queue and start its Tk-side consumer
+        self.input_service.subscribe("matcher", self.on_press)
+        self._drain_job = self.master.after(KEY_POLL_MS, self._drain_key_events)
         
         # Start emergency hotkey
         self._start_emergency_hotkey()
         
-        logger.info(f"Started listening for words: {self.words} via {platform}")
+        for name in names:
+            words = [word for word, profile in tagged_words if profile == name]
+            logger.info(f"Started listening for words: {words} via {self._runtimes[name].config.platform.value.title()} "
+                        f"(profile '{name}')")
+
+    def _locked_while_listening(self) -> list:
+        """Widgets whose settings are captured at start and can't change while listening."""
+        return [self.words_entry, self.duration_spin, self.intensity_spin, self.batching_check,
+                self.cooldown_spin, self.max_shocks_spin, self.profiling_check, self.profile_combo,
+                self.new_profile_btn, self.delete_profile_btn, self.profile_enabled_check]
 
     def stop_listening(self):
         """Stop listening and reset UI."""
-        if self.listener:
-            self.listener.stop()
-            self.listener = None
+        self.input_service.pause("matcher")
+        
+        if self._drain_job is not None:
+            self.master.after_cancel(self._drain_job)
+            self._drain_job = None
+        self._key_events.clear()
+        if self.trace_recorder is not None:
+            self.trace_recorder.stop()
+        for name in list(self._pending_confirmations):
+            self._cancel_confirmation(name, "Pending confirmation cancelled")
+        self.openshock_batcher.cancel()
+        for runtime in self._runtimes.values():
+            runtime.sequencer.abort()
         
         # Stop emergency hotkey
         self._stop_emergency_hotkey()
@@ -776,30 +2660,40 @@ Max/Min: {self.max_shocks_var.get()}/min"""
         self.emergency_btn.config(state="disabled")
         
         # Re-enable input fields
-        for widget in [self.words_entry, self.duration_spin, self.intensity_spin]:
+        for widget in self._locked_while_listening():
             widget.config(state="normal")
+        self.profile_combo.config(state="readonly")
         
         self.status_var.set("Stopped")
         self._update_statistics()
         
         logger.info("Stopped listening")
 
+    @staticmethod
+    def _hotkey_spec(hotkey: str) -> str:
+        """Convert a hotkey like 'ctrl+shift+esc' to pynput's '<ctrl>+<shift>+<esc>'."""
+        return "+".join(part if len(part) == 1 else f"<{part}>"
+                        for part in (part.strip().lower() for part in hotkey.split("+")))
+
+    def _hotkey_callbacks(self, hotkey: keyboard.HotKey):
+        """Press/release callbacks that drive a HotKey from the shared input hook."""
+        canonical = self.input_service.canonical
+        return (lambda key: hotkey.press(canonical(key)),
+                lambda key: hotkey.release(canonical(key)))
+
     def _start_emergency_hotkey(self):
-        """Start the global emergency hotkey listener."""
+        """Activate the global emergency hotkey on the shared input hook."""
         try:
             hotkey = self.hotkey_var.get()
             if not hotkey:
                 return
             
-            # Stop existing hotkey if any
-            self._stop_emergency_hotkey()
-            
-            # Create hotkey mapping
-            hotkey_map = {hotkey: self.emergency_stop}
-            
-            # Start global hotkey listener
-            self.emergency_hotkey = keyboard.GlobalHotKeys(hotkey_map)
-            self.emergency_hotkey.start()
+            # The hook thread must not touch Tk, so the stop is queued for the Tk thread
+            self.emergency_hotkey = keyboard.HotKey(
+                keyboard.HotKey.parse(self._hotkey_spec(hotkey)),
+                lambda: self._dispatch_results.append(self.emergency_stop)
+            )
+            self.input_service.subscribe("emergency", *self._hotkey_callbacks(self.emergency_hotkey))
             
             # Update status
             self.hotkey_status_var.set(f"✅ Active: {hotkey}")
@@ -813,19 +2707,17 @@ Max/Min: {self.max_shocks_var.get()}/min"""
             logger.error(f"Failed to start emergency hotkey: {e}")
 
     def _stop_emergency_hotkey(self):
-        """Stop the global emergency hotkey listener."""
-        try:
-            if self.emergency_hotkey:
-                self.emergency_hotkey.stop()
-                self.emergency_hotkey = None
-                
-            self.hotkey_status_var.set("Stopped - will reactivate when listening starts")
-            self.hotkey_status_label.config(foreground="orange")
-            
-            logger.info("Emergency hotkey deactivated")
-            
-        except Exception as e:
-            logger.error(f"Error stopping emergency hotkey: {e}")
+        """Pause the global emergency hotkey."""
+        if self.emergency_hotkey is None:
+            return
+        
+        self.input_service.pause("emergency")
+        self.emergency_hotkey = None
+        
+        self.hotkey_status_var.set("Stopped - will reactivate when listening starts")
+        self.hotkey_status_label.config(foreground="orange")
+        
+        logger.info("Emergency hotkey deactivated")
 
     def emergency_stop(self):
         """Emergency stop - immediately stop all operations."""
@@ -842,58 +2734,54 @@ Max/Min: {self.max_shocks_var.get()}/min"""
                 with open(settings_file, 'r') as f:
                     settings = json.load(f)
                 
-                # Load platform
-                if 'platform' in settings:
-                    self.platform_var.set(settings['platform'])
-                    self._on_platform_change()
-                
-                # Load API key
-                if 'api_key' in settings:
-                    self.api_key_var.set(settings['api_key'])
-                
-                # Load credentials
-                for key, var in self.credential_vars.items():
-                    if key in settings:
-                        var.set(settings[key])
+                # Load profiles; older files hold a single profile at the top level
+                if settings.get('profiles'):
+                    self.profiles = settings['profiles']
+                    active = settings.get('active_profile')
+                    self.active_profile = active if active in self.profiles else next(iter(self.profiles))
+                    self._apply_profile_settings(self.profiles[self.active_profile])
+                else:
+                    self._apply_profile_settings(settings)
                 
                 # Load other settings
-                if 'words' in settings:
-                    self.words_var.set(settings['words'])
-                if 'duration' in settings:
-                    self.duration_var.set(str(settings['duration']))
-                if 'intensity' in settings:
-                    self.intensity_var.set(str(settings['intensity']))
-                if 'cooldown' in settings:
-                    self.cooldown_var.set(str(settings['cooldown']))
-                if 'max_shocks' in settings:
-                    self.max_shocks_var.set(str(settings['max_shocks']))
                 if 'confirmation' in settings:
                     self.confirmation_var.set(settings['confirmation'])
                 if 'hotkey' in settings:
                     self.hotkey_var.set(settings['hotkey'])
+                for name, steps in settings.get('patterns', {}).items():
+                    try:
+                        self.patterns[name] = [PatternStep.from_dict(step) for step in steps]
+                    except (KeyError, TypeError, ValueError) as e:
+                        logger.error(f"Ignoring invalid pattern '{name}': {e}")
+                if 'endpoint_routes' in settings:
+                    for platform in Platform:
+                        routes = settings['endpoint_routes'].get(platform.value)
+                        if routes:
+                            self.api_routes[platform][:] = routes
                 
                 logger.info("Settings loaded from file")
                 
             except Exception as e:
                 logger.error(f"Failed to load settings: {e}")
+        
+        if self.active_profile not in self.profiles:
+            self.profiles[self.active_profile] = self._form_settings()
+        self._refresh_profile_choices()
 
     def _save_settings(self):
         """Save current settings to file."""
-        settings = {
-            'platform': self.platform_var.get(),
-            'api_key': self.api_key_var.get(),
-            'words': self.words_var.get(),
-            'duration': int(self.duration_var.get()),
-            'intensity': int(self.intensity_var.get()),
-            'cooldown': int(self.cooldown_var.get()),
-            'max_shocks': int(self.max_shocks_var.get()),
-            'confirmation': self.confirmation_var.get(),
-            'hotkey': self.hotkey_var.get()
-        }
+        self.profiles[self.active_profile] = self._form_settings()
         
-        # Add credentials
-        for key, var in self.credential_vars.items():
-            settings[key] = var.get()
+        # The active profile is also written at the top level for older versions
+        settings = dict(self.profiles[self.active_profile])
+        settings.update({
+            'confirmation': self.confirmation_var.get(),
+            'hotkey': self.hotkey_var.get(),
+            'patterns': {name: [step.to_dict() for step in steps] for name, steps in self.patterns.items()},
+            'endpoint_routes': {platform.value: routes for platform, routes in self.api_routes.items()},
+            'profiles': self.profiles,
+            'active_profile': self.active_profile
+        })
         
         try:
             with open("pishock_universal_settings.json", 'w') as f:
@@ -907,11 +2795,65 @@ Max/Min: {self.max_shocks_var.get()}/min"""
         self._save_settings()
         self.stop_listening()
         self._stop_emergency_hotkey()
+        self.input_service.stop()
+        self.health_monitor.stop()
+        self.dispatch_pool.shutdown(wait=False)
+        self.http.close()
+        if self.safety_ledger is not None:
+            self.safety_ledger.close()
+        if self.profiler is not None:
+            self.profiling_var.set(False)
+            self._toggle_profiling()
         self.master.destroy()
 
+def _parse_args(argv=None):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="PiShock/OpenShock Universal Trigger App")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the input and dispatch hot paths; written on exit")
+    parser.add_argument("--simulate", metavar="TRACE",
+                        help="replay a timed trigger trace against the safety limits and exit")
+    parser.add_argument("--record-trace", metavar="FILE",
+                        help="append a binary keystroke trace of each listening session to FILE")
+    parser.add_argument("--unredacted", action="store_true",
+                        help="record every typed character, not just trigger-word characters")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recorded trace through the matcher and safety limits and exit")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded speed")
+    parser.add_argument("--safety-ledger", metavar="FILE", default=str(SAFETY_LEDGER_PATH),
+                        help="file holding the safety budget shared with other local processes")
+    parser.add_argument("--no-shared-safety", action="store_true",
+                        help="only enforce safety limits within this process")
+    parser.add_argument("--cooldown", type=int,
+                        help="cooldown seconds for --simulate (default 5) or --replay (default: as recorded)")
+    parser.add_argument("--max-shocks", type=int,
+                        help="max shocks for --simulate (default 5) or --replay (default: as recorded)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = _parse_args()
+    if args.simulate or args.replay:
+        try:
+            if args.simulate:
+                with open(args.simulate, 'r') as f:
+                    run_simulation(f, 5 if args.cooldown is None else args.cooldown,
+                                   5 if args.max_shocks is None else args.max_shocks)
+            else:
+                replay_trace(args.replay, args.realtime, args.cooldown, args.max_shocks)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    
+    recorder = TraceRecorder(args.record_trace, redact=not args.unredacted) if args.record_trace else None
+    ledger = None
+    if not args.no_shared_safety:
+        try:
+            ledger = SafetyLedger(args.safety_ledger)
+        except OSError as e:
+            logger.warning(f"Shared safety ledger unavailable, limits apply to this process only: {e}")
     root = tk.Tk()
-    app = PiShockUniversalApp(root)
+    app = PiShockUniversalApp(root, profiling=args.profile, trace_recorder=recorder, safety_ledger=ledger)
     
     # Handle window closing
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
@@ -0,0 +1,18 @@
+"""Shared test setup: import the app without a display or a keyboard hook."""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The dummy backend lets pynput import headless; the app only starts a hook on demand
+os.environ.setdefault("PYNPUT_BACKEND", "dummy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The app opens pishock_universal.log in the working directory on import
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="pishock-tests-"))
+try:
+    import pishock_app  # noqa: F401
+finally:
+    os.chdir(_cwd)
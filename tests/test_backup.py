@@ -0,0 +1,106 @@
+"""Tests for the content-addressed backup store."""
+
+import json
+import os
+import time
+
+import pytest
+
+import backup_script
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "app.py").write_text("print('hello')\n")
+    (tmp_path / "README.md").write_text("# Readme\n")
+    (tmp_path / "notes.bin").write_bytes(b"not backed up")
+    return tmp_path
+
+
+def snapshot_name(manifest_path):
+    return manifest_path.stem
+
+
+def age_snapshot(manifest_path, name):
+    """Give a snapshot an older name, since names only have one-second resolution."""
+    manifest = json.loads(manifest_path.read_text())
+    manifest["name"] = name
+    older = manifest_path.with_name(f"{name}.json")
+    older.write_text(json.dumps(manifest))
+    manifest_path.unlink()
+    return older
+
+
+def age_objects(project):
+    """Move every stored object's mtime past the prune grace period."""
+    old = time.time() - backup_script.PRUNE_GRACE_SECONDS - 60
+    for object_file in (project / "backups" / "objects").glob("*/*"):
+        os.utime(object_file, (old, old))
+
+
+def test_create_verify_and_restore(project, tmp_path):
+    manifest_path, zip_path = backup_script.create_backup(make_zip=True)
+    name = snapshot_name(manifest_path)
+    assert sorted(json.loads(manifest_path.read_text())["files"]) == ["README.md", "app.py"]
+    assert zip_path.exists()
+    assert backup_script.verify_backup(name)
+
+    restored = tmp_path / "restored"
+    backup_script.restore_backup(name, restored)
+    assert (restored / "app.py").read_text() == "print('hello')\n"
+    assert (restored / "README.md").read_text() == "# Readme\n"
+
+
+def test_unchanged_files_are_deduplicated(project):
+    first = age_snapshot(backup_script.create_backup()[0], "pishock_backup_20000101_000000")
+    second, _ = backup_script.create_backup()
+    objects = list((project / "backups" / "objects").glob("*/*"))
+    assert len(objects) == 2
+    assert json.loads(first.read_text())["files"] == json.loads(second.read_text())["files"]
+
+
+def test_verify_detects_damage(project):
+    manifest_path, _ = backup_script.create_backup()
+    entry = json.loads(manifest_path.read_text())["files"]["app.py"]
+    backup_script.object_path(project / "backups", entry["sha256"]).write_bytes(b"garbage")
+    assert not backup_script.verify_backup(snapshot_name(manifest_path))
+
+
+def test_prune_keeps_newest_and_in_flight_objects(project):
+    old = age_snapshot(backup_script.create_backup()[0], "pishock_backup_20000101_000000")
+    old_digest = json.loads(old.read_text())["files"]["app.py"]["sha256"]
+    (project / "app.py").write_text("print('changed')\n")
+    new, _ = backup_script.create_backup()
+
+    objects = project / "backups" / "objects"
+    in_flight = objects / "ab" / "abcdef.1234.tmp"
+    in_flight.parent.mkdir(exist_ok=True)
+    in_flight.write_bytes(b"partial")
+
+    age_objects(project)
+    backup_script.prune_backups(keep=1)
+    assert not old.exists() and new.exists()
+    assert not backup_script.object_path(project / "backups", old_digest).exists()
+    assert in_flight.exists()
+    assert backup_script.verify_backup(snapshot_name(new))
+
+
+def test_prune_spares_objects_a_running_backup_just_stored_or_reused(project):
+    backups = project / "backups"
+    old = age_snapshot(backup_script.create_backup()[0], "pishock_backup_20000101_000000")
+    age_objects(project)
+    old.unlink()
+
+    # A concurrent backup reuses README.md's object and stores a new one, but has no manifest yet
+    (project / "app.py").write_text("print('in progress')\n")
+    reused, _, stored = backup_script.store_file(project / "README.md", backups)
+    assert not stored
+    added, _, stored = backup_script.store_file(project / "app.py", backups)
+    assert stored
+
+    backup_script.prune_backups(keep=1)
+    assert backup_script.object_path(backups, reused).exists()
+    assert backup_script.object_path(backups, added).exists()
+    # Only the aged object of the old app.py is gone
+    assert len(list((backups / "objects").glob("*/*"))) == 2
@@ -0,0 +1,70 @@
+"""Tests for OpenShock command batching."""
+
+import requests
+
+from pishock_app import CommandConfig, OpenShockBatcher, Platform
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} Error", response=response)
+
+
+def make_batcher(fail):
+    """Batcher whose sender records each request and raises fail(ids) if it returns an error."""
+    requests_sent, results = [], []
+
+    def send_batch(config, controls):
+        ids = [control["id"] for control in controls]
+        requests_sent.append((config.api_key, ids))
+        error = fail(ids)
+        if error is not None:
+            raise error
+
+    batcher = OpenShockBatcher(send_batch, lambda *result: results.append(result), flush_interval=60)
+    return batcher, requests_sent, results
+
+
+def config(token, devices):
+    return CommandConfig(Platform.OPENSHOCK, token, {"device_id": devices}, duration=1, intensity=10, batch=True)
+
+
+def submit_all(batcher, *configs):
+    for item in configs:
+        for device in item.devices:
+            batcher.submit(item, item.control(device))
+    batcher.flush()
+
+
+def test_commands_are_grouped_per_token():
+    batcher, sent, results = make_batcher(lambda ids: None)
+    submit_all(batcher, config("one", "a,b"), config("two", "c"), config("one", "d"))
+    assert sent == [("one", ["a", "b", "d"]), ("two", ["c"])]
+    assert sorted(results) == [(device, True, "OpenShock shock sent successfully") for device in "abcd"]
+
+
+def test_rejected_batch_is_split_down_to_the_bad_shocker():
+    batcher, sent, results = make_batcher(lambda ids: http_error(404) if "bad" in ids else None)
+    submit_all(batcher, config("token", "a,b,bad,c"))
+    assert sent == [("token", ["a", "b", "bad", "c"]), ("token", ["a", "b"]),
+                    ("token", ["bad", "c"]), ("token", ["bad"]), ("token", ["c"])]
+    assert {device: success for device, success, _ in results} == {"a": True, "b": True, "bad": False, "c": True}
+
+
+def test_other_failures_are_reported_once_for_the_whole_batch():
+    for error in (http_error(401), http_error(503), requests.ConnectionError("refused")):
+        batcher, sent, results = make_batcher(lambda ids: error)
+        submit_all(batcher, config("token", ",".join("abcdefgh")))
+        assert len(sent) == 1
+        assert [(device, success) for device, success, _ in results] == [(device, False) for device in "abcdefgh"]
+        assert results[0][2] == str(error)
+
+
+def test_cancel_drops_unsent_commands():
+    batcher, sent, _ = make_batcher(lambda ids: None)
+    item = config("token", "a")
+    batcher.submit(item, item.control("a"))
+    batcher.cancel()
+    batcher.flush()
+    assert sent == []
@@ -0,0 +1,58 @@
+"""Tests for the pre-serialized command bodies."""
+
+import json
+
+import pytest
+
+from pishock_app import CommandConfig, Platform
+
+PISHOCK_CREDENTIALS = {"username": "user", "device_id": "CODE1", "script_name": "App"}
+
+
+def test_pishock_body():
+    config = CommandConfig(Platform.PISHOCK, "key", PISHOCK_CREDENTIALS, duration=2, intensity=40)
+    assert json.loads(config.body()) == {
+        "Username": "user", "Apikey": "key", "Code": "CODE1", "Name": "App",
+        "Op": "0", "Duration": "2", "Intensity": "40"}
+    assert json.loads(config.body(intensity=10, op="vibrate"))["Op"] == "1"
+
+
+def test_pi3open_uses_the_pishock_format():
+    config = CommandConfig(Platform.PI3OPEN, "key", PISHOCK_CREDENTIALS, duration=1, intensity=5)
+    assert json.loads(config.body())["Code"] == "CODE1"
+
+
+def test_openshock_body_and_batch_controls():
+    config = CommandConfig(Platform.OPENSHOCK, "token", {"device_id": "a, b,"}, duration=3, intensity=25,
+                           batch=True)
+    assert config.devices == ("a", "b")
+    assert config.headers["Open-Shock-Token"] == "token"
+    assert json.loads(config.body(device="b")) == {"deviceId": "b", "type": 0, "intensity": 25, "duration": 3000}
+    # The v2 control API uses 1 for Shock (0 is Stop)
+    assert config.control("a") == {"id": "a", "type": 1, "intensity": 25, "duration": 3000, "exclusive": True}
+    assert config.control("a", 5, 300, "vibrate")["type"] == 2
+
+
+def test_batching_only_applies_to_openshock():
+    config = CommandConfig(Platform.PISHOCK, "key", PISHOCK_CREDENTIALS, duration=1, intensity=5, batch=True)
+    assert not config.batch
+
+
+@pytest.mark.parametrize("platform, requested, sent", [
+    (Platform.OPENSHOCK, 300, 300),
+    (Platform.PISHOCK, 300, 1000),
+    (Platform.PISHOCK, 2600, 3000),
+    (Platform.PI3OPEN, 200, 1000),
+])
+def test_sent_duration(platform, requested, sent):
+    credentials = {"device_id": "a"} if platform == Platform.OPENSHOCK else PISHOCK_CREDENTIALS
+    config = CommandConfig(platform, "key", credentials, duration=1, intensity=5)
+    assert config.sent_duration_ms(requested) == sent
+    if platform != Platform.OPENSHOCK:
+        assert json.loads(config.body(duration_ms=requested))["Duration"] == str(sent // 1000)
+
+
+def test_config_is_immutable():
+    config = CommandConfig(Platform.PISHOCK, "key", PISHOCK_CREDENTIALS, duration=1, intensity=5)
+    with pytest.raises(AttributeError):
+        config.intensity = 100
@@ -0,0 +1,162 @@
+"""Tests for the non-modal, expiring shock confirmation prompts."""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import pishock_app
+from pishock_app import CONFIRMATION_TIMEOUT, Platform, PiShockUniversalApp, VirtualClock
+
+
+class FakeVar:
+    def __init__(self, value=None):
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class FakeWindow:
+    def __init__(self, master):
+        self.destroyed = False
+        self.buttons = {}
+
+    def destroy(self):
+        self.destroyed = True
+
+    def __getattr__(self, name):
+        # title, transient, resizable, protocol
+        return lambda *args, **kwargs: None
+
+
+class FakeWidget:
+    def __init__(self, window, text=None, command=None, **kwargs):
+        if command is not None:
+            window.buttons[text] = command
+
+    def grid(self, **kwargs):
+        pass
+
+
+class FakeMaster:
+    def __init__(self):
+        self.jobs = {}
+
+    def after(self, ms, callback, *args):
+        job = len(self.jobs) + 1
+        self.jobs[job] = (callback, args)
+        return job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_pending(self):
+        jobs, self.jobs = self.jobs, {}
+        for callback, args in jobs.values():
+            callback(*args)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(pishock_app.tk, "Toplevel", FakeWindow)
+    monkeypatch.setattr(pishock_app.tk, "StringVar", FakeVar)
+    monkeypatch.setattr(pishock_app.ttk, "Label", FakeWidget)
+    monkeypatch.setattr(pishock_app.ttk, "Button", FakeWidget)
+
+    app = object.__new__(PiShockUniversalApp)
+    app.master = FakeMaster()
+    app.clock = VirtualClock(100.0)
+    app.is_listening = True
+    app.patterns = {"tease": [None, None]}
+    app._pending_confirmations = {}
+    config = SimpleNamespace(platform=Platform.PISHOCK, duration=1, intensity=10)
+    app.runtime = SimpleNamespace(name="Main", config=config, sequencer=mock.Mock())
+    app._runtimes = {"Main": app.runtime}
+    app.statuses, app.delivered = [], []
+    app._status = lambda runtime, message: app.statuses.append(message)
+    app._deliver_shock = lambda runtime, pattern=None: app.delivered.append((runtime.name, pattern))
+    return app
+
+
+def prompt(app):
+    return app._pending_confirmations["Main"]
+
+
+def test_prompt_expires_at_the_timeout(app):
+    app._request_confirmation(app.runtime)
+    assert prompt(app).countdown_var.get() == f"Expires in {CONFIRMATION_TIMEOUT}s"
+
+    app.clock.advance_to(100.0 + CONFIRMATION_TIMEOUT - 0.5)
+    app.master.run_pending()
+    assert "Main" in app._pending_confirmations
+
+    window = prompt(app).window
+    app.clock.advance_to(100.0 + CONFIRMATION_TIMEOUT)
+    app.master.run_pending()
+    assert app._pending_confirmations == {}
+    assert window.destroyed and not app.master.jobs
+    assert app.statuses[-1] == "Confirmation timed out - shock cancelled"
+    assert app.delivered == []
+
+
+def test_repeated_triggers_collapse_into_one_prompt(app):
+    app._request_confirmation(app.runtime)
+    window = prompt(app).window
+    app._request_confirmation(app.runtime)
+    app._request_confirmation(app.runtime)
+    assert prompt(app).window is window
+    assert prompt(app).triggers == 3
+    assert prompt(app).countdown_var.get().endswith("(3 triggers)")
+    assert len(app.master.jobs) == 1
+
+    window.buttons["Yes"]()
+    assert app.delivered == [("Main", None)]
+
+
+def test_yes_after_the_deadline_does_not_shock(app):
+    app._request_confirmation(app.runtime, "tease")
+    yes = prompt(app).window.buttons["Yes"]
+    app.clock.advance_to(100.0 + CONFIRMATION_TIMEOUT + 1)
+    # Clicked before the countdown job noticed the deadline
+    yes()
+    assert app.delivered == []
+    assert app.statuses[-1] == "Confirmation no longer valid - shock cancelled"
+
+
+def test_yes_after_stopping_does_not_shock(app):
+    app._request_confirmation(app.runtime)
+    yes = prompt(app).window.buttons["Yes"]
+    app.is_listening = False
+    yes()
+    assert app.delivered == []
+
+
+def test_no_cancels(app):
+    app._request_confirmation(app.runtime)
+    prompt(app).window.buttons["No"]()
+    assert app.delivered == [] and app._pending_confirmations == {}
+    assert app.statuses[-1] == "Shock cancelled by user"
+
+
+def test_stop_listening_closes_pending_prompts(app):
+    app._request_confirmation(app.runtime)
+    window = prompt(app).window
+    for name in ("input_service", "openshock_batcher", "start_btn", "stop_btn", "emergency_btn",
+                 "profile_combo", "status_var"):
+        setattr(app, name, mock.Mock())
+    app._drain_job = None
+    app._key_events = []
+    app.trace_recorder = None
+    app._stop_emergency_hotkey = mock.Mock()
+    app._locked_while_listening = lambda: []
+    app._update_statistics = mock.Mock()
+
+    app.stop_listening()
+    assert app._pending_confirmations == {}
+    assert window.destroyed and not app.master.jobs
+    window.buttons["Yes"]()
+    assert app.delivered == []
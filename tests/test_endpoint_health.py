@@ -0,0 +1,62 @@
+"""Tests for endpoint health probing and route selection."""
+
+import pytest
+
+from pishock_app import EndpointHealthMonitor, Platform
+
+PRIMARY = "https://primary.example/api"
+MIRROR = "https://mirror.example/api"
+OTHER = "https://other.example/api"
+
+
+def make_monitor(rtts):
+    """Monitor whose probes return successive RTTs per URL (None for a failure)."""
+    monitor = EndpointHealthMonitor({Platform.PISHOCK: [PRIMARY, MIRROR], Platform.OPENSHOCK: [OTHER]})
+    pending = {url: list(values) for url, values in rtts.items()}
+    monitor._probe = lambda url: pending[url].pop(0)
+    return monitor
+
+
+def probe(monitor, times):
+    for _ in range(times):
+        monitor.probe_all()
+
+
+def test_stats():
+    monitor = make_monitor({PRIMARY: [0.1, None, 0.3], MIRROR: [None] * 3, OTHER: [0.2] * 3})
+    probe(monitor, 3)
+    assert monitor.stats(PRIMARY) == {"probes": 3, "availability": pytest.approx(2 / 3),
+                                      "avg_rtt": pytest.approx(0.2), "last_rtt": 0.3, "healthy": True}
+    assert monitor.stats(MIRROR)["healthy"] is False
+    assert monitor.stats("https://unknown.example/") == {
+        "probes": 0, "availability": None, "avg_rtt": None, "last_rtt": None, "healthy": False}
+
+
+def test_fastest_healthy_route_wins():
+    monitor = make_monitor({PRIMARY: [0.3, 0.3], MIRROR: [0.1, 0.1], OTHER: [0.2, 0.2]})
+    assert monitor.best_route(Platform.PISHOCK) == PRIMARY  # Until probed
+    probe(monitor, 2)
+    assert monitor.best_route(Platform.PISHOCK) == MIRROR
+    assert monitor.best_route(Platform.OPENSHOCK) == OTHER
+
+
+def test_failing_route_loses_to_a_slower_healthy_one():
+    monitor = make_monitor({PRIMARY: [0.3, 0.3], MIRROR: [0.1, None], OTHER: [0.2, 0.2]})
+    probe(monitor, 2)
+    # The mirror's last probe failed, so it is not healthy any more
+    assert monitor.best_route(Platform.PISHOCK) == PRIMARY
+
+
+def test_first_route_when_none_is_healthy():
+    monitor = make_monitor({PRIMARY: [None], MIRROR: [None], OTHER: [None]})
+    probe(monitor, 1)
+    assert monitor.best_route(Platform.PISHOCK) == PRIMARY
+    assert monitor.best_route(Platform.OPENSHOCK) == OTHER
+
+
+def test_routes_no_longer_configured_are_ignored():
+    monitor = make_monitor({PRIMARY: [0.3], MIRROR: [0.1], OTHER: [0.2]})
+    probe(monitor, 1)
+    assert monitor.best_route(Platform.PISHOCK) == MIRROR
+    monitor.routes[Platform.PISHOCK] = [PRIMARY]
+    assert monitor.best_route(Platform.PISHOCK) == PRIMARY
@@ -0,0 +1,61 @@
+"""Tests for the shared keyboard hook."""
+
+from pishock_app import InputService
+
+
+class FakeListener:
+    def __init__(self, on_press, on_release):
+        self.on_press = on_press
+        self.on_release = on_release
+        self.started = self.stopped = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.stopped = True
+
+
+def make_service():
+    listeners = []
+
+    def factory(**callbacks):
+        listeners.append(FakeListener(**callbacks))
+        return listeners[-1]
+    return InputService(factory), listeners
+
+
+def test_hook_is_installed_once_and_paused_subscribers_are_skipped():
+    service, listeners = make_service()
+    presses = []
+    service.subscribe("a", lambda key: presses.append(("a", key)))
+    service.subscribe("b", lambda key: presses.append(("b", key)))
+    service.pause("a")
+    listeners[0].on_press("x")
+    service.resume("a")
+    listeners[0].on_press("y")
+
+    assert len(listeners) == 1 and listeners[0].started
+    assert presses == [("b", "x"), ("a", "y"), ("b", "y")]
+
+
+def test_failing_subscriber_does_not_stop_the_others():
+    service, listeners = make_service()
+    presses, releases = [], []
+
+    def broken(key):
+        raise RuntimeError("boom")
+
+    service.subscribe("broken", broken, broken)
+    service.subscribe("emergency", presses.append, releases.append)
+    assert listeners[0].on_press("k") is None
+    assert listeners[0].on_release("k") is None
+    assert presses == ["k"] and releases == ["k"]
+
+
+def test_stop_removes_the_hook():
+    service, listeners = make_service()
+    service.subscribe("a", lambda key: None)
+    service.stop()
+    assert listeners[0].stopped
+    assert not service.is_active("a")
@@ -0,0 +1,74 @@
+"""Tests for the Tk-thread key event and dispatch result consumers."""
+
+from collections import deque
+
+from pishock_app import KEY_POLL_MS, PiShockUniversalApp, TriggerMatcher
+
+
+class FakeMaster:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback, *args):
+        self.scheduled.append((ms, callback))
+        return len(self.scheduled)
+
+
+class FailingRecorder:
+    def key(self, stamp, key):
+        if key == "!":
+            raise OSError("disk full")
+
+    def match(self, profile, word):
+        pass
+
+
+def make_app(recorder=None):
+    app = object.__new__(PiShockUniversalApp)
+    app.master = FakeMaster()
+    app.is_listening = True
+    app.trace_recorder = recorder
+    app.matcher = TriggerMatcher([("zap", "Main")])
+    app._key_events = deque()
+    app._dispatch_results = deque()
+    app.shocks = []
+    app.shock = lambda profile, word: app.shocks.append((profile, word))
+    return app
+
+
+def test_failing_event_is_skipped_and_draining_continues():
+    app = make_app(FailingRecorder())
+    app._key_events.extend((0.0, ch) for ch in "za!p")
+    app._drain_key_events()
+    assert app.shocks == [("Main", "zap")]
+    assert app.master.scheduled == [(KEY_POLL_MS, app._drain_key_events)]
+
+
+def test_failing_shock_still_reschedules():
+    app = make_app()
+
+    def broken_shock(profile, word):
+        raise RuntimeError("ledger lock timed out")
+
+    app.shock = broken_shock
+    app._key_events.extend((0.0, ch) for ch in "zapzap")
+    app._drain_key_events()
+    assert not app._key_events
+    assert len(app.master.scheduled) == 1
+
+
+def test_failing_dispatch_result_does_not_block_the_rest():
+    app = make_app()
+    ran = []
+    app._dispatch_results.extend([lambda: 1 / 0, lambda: ran.append("emergency stop")])
+    app._drain_key_events()
+    assert ran == ["emergency stop"]
+    assert len(app.master.scheduled) == 1
+
+
+def test_draining_stops_with_listening():
+    app = make_app()
+    app.is_listening = False
+    app._key_events.extend((0.0, ch) for ch in "zap")
+    app._drain_key_events()
+    assert app.shocks == [] and app.master.scheduled == []
@@ -0,0 +1,60 @@
+"""Tests for the log analyzer."""
+
+import log_analyzer
+
+LINES = [
+    "2025-01-01 10:00:00,000 - INFO - PiShock Universal App initialized",
+    "2025-01-01 10:00:05,000 - INFO - Started listening via pishock",
+    "2025-01-01 10:01:00,000 - INFO - Shock delivered via pishock! (1 total)",
+    "2025-01-01 10:02:00,000 - ERROR - Shock failed via pishock: 429 Client Error: Too Many Requests",
+    "2025-01-01 11:00:00,000 - ERROR - Shock failed via openshock: Read timed out. (read timeout=10)",
+    "2025-01-01 11:00:01,000 - ERROR - Shock failed via openshock: 503 Server Error: Unavailable",
+    "2025-01-01 11:00:02,000 - INFO - Pattern 'tease' delivered via openshock! (4 total)",
+    "2025-01-01 11:00:03,000 - WARNING - Pattern 'wave' aborted via openshock: rate limit reached",
+    "2025-01-01 11:30:05,000 - INFO - Stopped listening",
+    "2025-01-01 12:00:00,000 - CRITICAL - Emergency stop activated",
+]
+
+
+def write_log(path, repeat):
+    path.write_text("\n".join(LINES * repeat) + "\n")
+
+
+def test_report_counts(tmp_path):
+    log = tmp_path / "app.log"
+    write_log(log, 1)
+    report = log_analyzer.build_report(log_analyzer.analyze_log(str(log)))
+
+    assert report["lines"] == len(LINES)
+    assert report["levels"] == {"INFO": 5, "WARNING": 1, "ERROR": 3, "CRITICAL": 1}
+    assert report["platforms"]["pishock"] == {
+        "delivered": 1, "failed": 1, "patterns_delivered": 0, "patterns_aborted": 0}
+    assert report["platforms"]["openshock"]["failed"] == 2
+    assert report["platforms"]["openshock"]["patterns_aborted"] == 1
+    assert report["hours"]["2025-01-01 11"] == {"delivered": 0, "failed": 2}
+    assert report["errors"] == {"rate limited": 1, "timeout": 1, "HTTP 503": 1}
+    sessions = report["sessions"]
+    assert (sessions["launches"], sessions["sessions"], sessions["emergency_stops"]) == (1, 1, 1)
+    assert sessions["listening_seconds"] == 90 * 60
+
+
+def test_parallel_matches_serial(tmp_path, monkeypatch):
+    log = tmp_path / "app.log"
+    write_log(log, 200)
+    serial = log_analyzer.build_report(log_analyzer.analyze_log(str(log), jobs=1))
+
+    monkeypatch.setattr(log_analyzer, "PARALLEL_THRESHOLD", 0)
+    monkeypatch.setattr(log_analyzer, "CHUNK_SIZE", 1000)
+    parallel = log_analyzer.build_report(log_analyzer.analyze_log(str(log), jobs=3))
+    chunked = log_analyzer.build_report(log_analyzer.analyze_log(str(log), jobs=1))
+
+    assert parallel == serial
+    assert chunked == serial
+    assert serial["sessions"]["sessions"] == 200
+
+
+def test_empty_log(tmp_path):
+    log = tmp_path / "empty.log"
+    log.write_bytes(b"")
+    report = log_analyzer.build_report(log_analyzer.analyze_log(str(log)))
+    assert report["lines"] == 0 and report["platforms"] == {}
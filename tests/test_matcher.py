@@ -0,0 +1,50 @@
+"""Tests for the multi-profile trigger word matcher."""
+
+from pishock_app import TriggerMatcher
+
+
+def feed(matcher, text):
+    return [match for ch in text for match in matcher.feed(ch)]
+
+
+def test_words_are_found_inside_typed_text():
+    matcher = TriggerMatcher([("zap", "Main")])
+    assert feed(matcher, "a quick ZAP!") == [("Main", "zap")]
+
+
+def test_overlapping_words_match_once_per_profile():
+    matcher = TriggerMatcher([("zap", "Main"), ("ap", "Main"), ("ap", "Partner"), ("zapper", "Partner")])
+    # "zap" ends where "ap" ends: one match for each profile, the longest word per profile
+    assert sorted(feed(matcher, "zap")) == [
+        ("Main", "zap"), ("Partner", "ap")]
+
+
+def test_profiles_match_independently():
+    matcher = TriggerMatcher([("cat", "Main"), ("scatter", "Partner")])
+    # Main matching "cat" must not drop Partner's partly typed "scatter"
+    assert feed(matcher, "scatter") == [("Main", "cat"), ("Partner", "scatter")]
+
+    matcher = TriggerMatcher([("zap", "Main"), ("apple", "Partner")])
+    assert feed(matcher, "zapple") == [("Main", "zap"), ("Partner", "apple")]
+
+
+def test_matching_restarts_after_a_match_within_a_profile():
+    matcher = TriggerMatcher([("aa", "Main"), ("aa", "Partner")])
+    # Like clearing each profile's typed buffer, a match can't reuse the previous one's letters
+    assert feed(matcher, "aaa") == [("Main", "aa"), ("Partner", "aa")]
+    assert feed(matcher, "a") == [("Main", "aa"), ("Partner", "aa")]
+
+    matcher = TriggerMatcher([("zap", "Main"), ("ap", "Main")])
+    assert feed(matcher, "zapap") == [("Main", "zap"), ("Main", "ap")]
+
+
+def test_same_word_in_two_profiles_matches_both():
+    matcher = TriggerMatcher([("ouch", "Main"), ("ouch", "Partner")])
+    assert sorted(feed(matcher, "ouch")) == [("Main", "ouch"), ("Partner", "ouch")]
+
+
+def test_reset_forgets_partial_words():
+    matcher = TriggerMatcher([("zap", "Main")])
+    feed(matcher, "za")
+    matcher.reset()
+    assert feed(matcher, "p") == []
@@ -0,0 +1,98 @@
+"""Tests for pulse pattern steps and the pattern sequencer."""
+
+import threading
+import time
+
+import pytest
+
+from pishock_app import PatternSequencer, PatternStep
+
+
+def test_step_from_dict_defaults_and_round_trip():
+    step = PatternStep.from_dict({"intensity": "20", "duration_ms": 300})
+    assert (step.op, step.intensity, step.duration_ms, step.gap_ms) == ("shock", 20, 300, 0)
+    assert PatternStep.from_dict(step.to_dict()).to_dict() == step.to_dict()
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"op": "zap", "intensity": 20, "duration_ms": 300}, "unknown op"),
+    ({"intensity": 0, "duration_ms": 300}, "intensity"),
+    ({"intensity": 20, "duration_ms": 50}, "duration_ms"),
+    ({"intensity": 20, "duration_ms": 300, "gap_ms": -1}, "gap_ms"),
+])
+def test_step_from_dict_rejects_bad_fields(data, message):
+    with pytest.raises(ValueError, match=message):
+        PatternStep.from_dict(data)
+
+
+class Run:
+    """Runs a pattern and collects when each step was sent and how it finished."""
+
+    def __init__(self, steps, sent_ms, allow_step=lambda step: None, fail_at=None):
+        self.sends = []
+        self.finished = threading.Event()
+        self.sequencer = PatternSequencer(allow_step, self._finish)
+        self.fail_at = fail_at
+        self.sequencer.start("test", steps, lambda step: (self._send, sent_ms))
+
+    def _send(self):
+        self.sends.append(time.perf_counter())
+        if len(self.sends) == self.fail_at:
+            return False, "HTTP 500"
+        return True, "sent"
+
+    def _finish(self, *result):
+        self.result = result
+        self.finished.set()
+
+    def wait(self):
+        assert self.finished.wait(5)
+        return self.result
+
+
+def test_schedule_advances_by_the_sent_duration():
+    # Each step asks for 10ms, but the device runs for the 60ms actually sent
+    steps = [PatternStep("shock", 10, 10, gap_ms=20) for _ in range(3)]
+    run = Run(steps, sent_ms=60)
+    name, sent, total, jitters, reason = run.wait()
+    assert (name, sent, total, reason) == ("test", 3, 3, None)
+    gaps = [later - earlier for earlier, later in zip(run.sends, run.sends[1:])]
+    assert all(gap >= 0.079 for gap in gaps), gaps
+    # Jitter is reported per sent step, in milliseconds
+    assert len(jitters) == 3 and all(0 <= jitter < 100 for jitter in jitters)
+
+
+def test_abort_mid_sequence():
+    steps = [PatternStep("shock", 10, 100, gap_ms=0) for _ in range(3)]
+    run = Run(steps, sent_ms=200)
+    while not run.sends:
+        time.sleep(0.001)
+    run.sequencer.abort()
+    _, sent, total, jitters, reason = run.wait()
+    assert (sent, total, reason) == (1, 3, "aborted")
+    assert len(jitters) == 1
+
+
+def test_allow_step_can_stop_the_pattern():
+    shocks = []
+
+    def allow_step(step):
+        if step.op != "shock":
+            return None
+        if shocks:
+            return "rate limit reached"
+        shocks.append(step)
+        return None
+
+    steps = [PatternStep("shock", 10, 10), PatternStep("vibrate", 10, 10), PatternStep("shock", 10, 10)]
+    run = Run(steps, sent_ms=10, allow_step=allow_step)
+    _, sent, total, _, reason = run.wait()
+    # The second shock step is denied before it is sent
+    assert (sent, total, reason) == (2, 3, "rate limit reached")
+    assert len(run.sends) == 2
+
+
+def test_failed_step_aborts():
+    run = Run([PatternStep("shock", 10, 10) for _ in range(3)], sent_ms=10, fail_at=2)
+    _, sent, _, _, reason = run.wait()
+    assert (sent, reason) == (1, "step failed: HTTP 500")
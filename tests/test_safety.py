@@ -0,0 +1,162 @@
+"""Tests for the local safety limiter and the cross-process safety ledger."""
+
+import multiprocessing
+import threading
+
+import pytest
+
+from pishock_app import (PiShockUniversalApp, Platform, SafetyLedger, SafetyLimiter, SharedLimitReason,
+                         VirtualClock, SAFETY_WINDOW)
+
+
+@pytest.fixture
+def ledger_path(tmp_path):
+    return tmp_path / "ledger.bin"
+
+
+def test_limiter_counts_max_shocks_per_minute():
+    clock = VirtualClock()
+    limiter = SafetyLimiter(clock)
+    for _ in range(3):
+        assert limiter.take(0, 3) is None
+    assert "too many shocks this minute" in limiter.take(0, 3)
+
+    clock.advance_to(clock.now + SAFETY_WINDOW)
+    assert limiter.take(0, 3) is None
+    assert limiter.shock_count == 4
+
+
+def test_limiter_cooldown_and_uncounted_take():
+    clock = VirtualClock()
+    limiter = SafetyLimiter(clock)
+    assert limiter.take(5, 1, count=False) is None
+    assert limiter.take(5, 1).startswith("Cooldown active")
+    clock.advance_to(clock.now + 5)
+    assert limiter.take(5, 1) is None
+    assert limiter.shock_count == 1
+
+
+def test_ledger_shares_cooldown_between_instances(ledger_path):
+    clock = VirtualClock(1000.0)
+    key = SafetyLedger.device_key(Platform.PISHOCK, "code")
+    first = SafetyLedger(ledger_path, clock)
+    second = SafetyLedger(ledger_path, clock)
+    try:
+        assert first.take([key], 10, 5) is None
+        reason = second.take([key], 10, 5)
+        assert isinstance(reason, SharedLimitReason)
+        assert reason.startswith("Cooldown active (shared)")
+        clock.advance_to(clock.now + 10)
+        assert second.take([key], 10, 5) is None
+    finally:
+        first.close()
+        second.close()
+
+
+def test_ledger_window_matches_limiter(ledger_path):
+    clock = VirtualClock(1000.0)
+    key = SafetyLedger.device_key(Platform.OPENSHOCK, "id")
+    ledger = SafetyLedger(ledger_path, clock)
+    try:
+        for _ in range(2):
+            assert ledger.take([key], 0, 2) is None
+        assert "this minute" in ledger.take([key], 0, 2)
+        clock.advance_to(clock.now + SAFETY_WINDOW)
+        assert ledger.take([key], 0, 2) is None
+    finally:
+        ledger.close()
+
+
+def test_ledger_probes_past_colliding_slots(ledger_path):
+    clock = VirtualClock(1000.0)
+    # Same first four bytes, so both keys hash to the same home slot
+    first_key = b"\x00" * 4 + b"a" * 12
+    second_key = b"\x00" * 4 + b"b" * 12
+    ledger = SafetyLedger(ledger_path, clock)
+    try:
+        assert ledger.take([first_key], 10, 5) is None
+        assert ledger.take([second_key], 10, 5) is None
+        assert ledger.take([first_key], 10, 5) is not None
+        assert ledger.take([second_key], 10, 5) is not None
+    finally:
+        ledger.close()
+
+
+def test_ledger_ignores_stamps_from_before_a_reboot(ledger_path):
+    key = SafetyLedger.device_key(Platform.PISHOCK, "code")
+    before = SafetyLedger(ledger_path, VirtualClock(50000.0))
+    try:
+        for _ in range(3):
+            assert before.take([key], 0, 3) is None
+    finally:
+        before.close()
+
+    # The monotonic clock restarts near zero, leaving the old stamps in the future
+    after = SafetyLedger(ledger_path, VirtualClock(100.0))
+    try:
+        assert after.check([key], 60, 3) is None
+        assert after.take([key], 60, 3) is None
+    finally:
+        after.close()
+
+
+def test_limiters_in_one_process_take_the_budget_once(ledger_path):
+    key = SafetyLedger.device_key(Platform.PISHOCK, "code")
+    ledger = SafetyLedger(ledger_path)
+    limiters = [SafetyLimiter(ledger=ledger, ledger_keys=[key]) for _ in range(8)]
+    barrier = threading.Barrier(len(limiters))
+    results = []
+
+    def race(limiter):
+        barrier.wait()
+        results.append(limiter.take(30, 5))
+
+    threads = [threading.Thread(target=race, args=(limiter,)) for limiter in limiters]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        ledger.close()
+    assert results.count(None) == 1
+
+
+def _take_in_process(path, start, results):
+    ledger = SafetyLedger(path)
+    try:
+        start.wait()
+        results.put(ledger.take([SafetyLedger.device_key(Platform.PISHOCK, "code")], 30, 5))
+    finally:
+        ledger.close()
+
+
+def test_two_processes_cannot_both_take_the_last_shock(ledger_path, monkeypatch):
+    # Spawned workers import the app, which opens its log file in the working directory
+    monkeypatch.chdir(ledger_path.parent)
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    workers = [context.Process(target=_take_in_process, args=(str(ledger_path), start, results))
+               for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    outcomes = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=30)
+    assert outcomes.count(None) == 1
+
+
+@pytest.mark.parametrize("max_shocks, valid", [("1", True), ("20", True), ("0", False), ("-3", False),
+                                               ("21", False), ("30", False), ("many", False)])
+def test_max_shocks_must_fit_the_ledger(max_shocks, valid):
+    app = object.__new__(PiShockUniversalApp)
+    app.credential_vars = dict.fromkeys(("username", "device_id", "script_name"))
+    app.credential_labels = {key: key for key in app.credential_vars}
+    app.patterns = {}
+    settings = {"platform": "pishock", "api_key": "key", "username": "user", "device_id": "code",
+                "script_name": "app", "duration": 1, "intensity": 10, "words": "zap", "cooldown": 5,
+                "max_shocks": max_shocks}
+    errors = app._validate_settings(settings)
+    assert (errors == []) == valid, errors
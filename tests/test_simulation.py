@@ -0,0 +1,43 @@
+"""Tests for the virtual-clock safety simulation."""
+
+import io
+
+import pytest
+
+from pishock_app import run_simulation
+
+
+def simulate(lines, cooldown=5, max_shocks=5):
+    out = io.StringIO()
+    return run_simulation(lines, cooldown, max_shocks, out), out.getvalue()
+
+
+def test_multi_hour_trace_runs_on_virtual_time():
+    # A trigger every 2 seconds for three hours
+    lines = [f"{second} zap" for second in range(0, 3 * 3600, 2)]
+    totals, output = simulate(lines)
+    # Cooldown allows one shock every 6 s, so the per-minute cap of 5 is what binds
+    assert totals == {"allowed": 3 * 60 * 5, "denied": len(lines) - 3 * 60 * 5}
+    assert output.splitlines()[:6] == [
+        "[     0.000s] ALLOW zap (1 total)",
+        "[     2.000s] DENY  zap: Cooldown active - 3.0s remaining",
+        "[     4.000s] DENY  zap: Cooldown active - 1.0s remaining",
+        "[     6.000s] ALLOW zap (2 total)",
+        "[     8.000s] DENY  zap: Cooldown active - 3.0s remaining",
+        "[    10.000s] DENY  zap: Cooldown active - 1.0s remaining",
+    ]
+    assert "[    30.000s] DENY  zap: Rate limit reached - too many shocks this minute" in output
+    assert "[    60.000s] ALLOW zap (6 total)" in output
+
+
+def test_comments_blank_lines_and_unordered_timestamps():
+    lines = ["# warm-up", "", "10 zap  # first", "5 zap", "16.5 ouch"]
+    totals, output = simulate(lines, cooldown=6, max_shocks=2)
+    # Time never runs backwards, so the line at 5 s is judged at 10 s
+    assert totals == {"allowed": 2, "denied": 1}
+    assert "[    16.500s] ALLOW ouch (2 total)" in output
+
+
+def test_bad_timestamp_names_the_line():
+    with pytest.raises(ValueError, match="line 2: invalid timestamp 'soon'"):
+        simulate(["1 zap", "soon zap"])
@@ -0,0 +1,75 @@
+"""Tests for the per-endpoint AIMD throttle and Retry-After parsing."""
+
+import time
+from email.utils import formatdate
+
+import pytest
+
+from pishock_app import EndpointThrottle, VirtualClock, parse_retry_after
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({}, None),
+    ({"Retry-After": "7"}, 7.0),
+    ({"Retry-After": "-3"}, 0.0),
+    ({"Retry-After": "soon"}, None),
+    ({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "12"}, 12.0),
+    ({"RateLimit-Remaining": "0", "RateLimit-Reset": "4"}, 4.0),
+    ({"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": "12"}, None),
+])
+def test_parse_retry_after(headers, expected):
+    assert parse_retry_after(headers) == expected
+
+
+def test_parse_retry_after_dates_and_epochs():
+    date = formatdate(time.time() + 30, usegmt=True)
+    assert parse_retry_after({"Retry-After": date}) == pytest.approx(30, abs=2)
+    epoch = str(int(time.time()) + 20)
+    assert parse_retry_after({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": epoch}) == pytest.approx(20, abs=2)
+
+
+def test_rate_and_concurrency_limits():
+    clock = VirtualClock(100.0)
+    throttle = EndpointThrottle(max_rate=2, max_concurrency=4, clock=clock)
+    assert throttle.acquire() is None
+    assert throttle.acquire() is None
+    assert throttle.acquire().startswith("Send rate limited")
+    clock.advance_to(clock.now + 0.5)
+    assert throttle.acquire() is None
+
+    throttle = EndpointThrottle(max_rate=10, max_concurrency=1, clock=clock)
+    assert throttle.acquire() is None
+    assert throttle.acquire().startswith("Too many requests in flight")
+    throttle.release(200, 0.1)
+    assert throttle.acquire() is None
+
+
+def test_429_blocks_and_halves_then_recovers():
+    clock = VirtualClock(100.0)
+    throttle = EndpointThrottle(max_rate=10, max_concurrency=4, clock=clock)
+    assert throttle.acquire() is None
+    throttle.release(429, 0.1, retry_after=5)
+    assert (throttle.rate, throttle.concurrency) == (5, 2)
+    assert throttle.acquire().startswith("Rate limited by server")
+
+    clock.advance_to(clock.now + 5)
+    for _ in range(4):
+        assert throttle.acquire() is None
+        throttle.release(200, 0.1)
+    assert throttle.rate == 7
+    assert throttle.concurrency == 3
+
+
+def test_one_decrease_per_round_trip():
+    clock = VirtualClock(100.0)
+    throttle = EndpointThrottle(max_rate=10, max_concurrency=4, clock=clock)
+    for _ in range(3):
+        throttle.acquire()
+    for _ in range(3):
+        throttle.release(503, 0.2)
+    assert throttle.rate == pytest.approx(7)
+
+    clock.advance_to(clock.now + 1)
+    throttle.acquire()
+    throttle.release(None, 0.2)
+    assert throttle.rate == pytest.approx(4.9)
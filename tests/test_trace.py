@@ -0,0 +1,137 @@
+"""Tests for trace recording, reading and replay."""
+
+import io
+
+import pytest
+
+from pishock_app import TRACE_DELIVERY, TRACE_OUTCOME, TraceRecorder, read_trace, replay_trace
+
+
+def type_word(recorder, stamp, word, profile="Main", allowed=True, shared=False):
+    for i, ch in enumerate(word):
+        recorder.key(stamp + i * 0.1, ch)
+    recorder.match(profile, word)
+    recorder.outcome(profile, allowed, shared)
+    return stamp + len(word) * 0.1
+
+
+def replay(path, **kwargs):
+    out = io.StringIO()
+    return replay_trace(path, out=out, **kwargs), out.getvalue()
+
+
+def test_cancelled_confirmation_does_not_spend_the_budget(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 10, 5, ["zap"])])
+    # The first shock's confirmation is cancelled, so the second is allowed and delivered
+    type_word(recorder, 100.0, "zap")
+    end = type_word(recorder, 102.0, "zap")
+    recorder.delivery(end, "Main")
+    type_word(recorder, 104.0, "zap", allowed=False)
+    recorder.stop()
+
+    totals, output = replay(path)
+    assert totals == {"keys": 9, "allowed": 2, "denied": 1, "diverged": 0}, output
+
+
+def test_shared_denials_and_patterns_are_not_flagged(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 0, 5, ["zap"])])
+    type_word(recorder, 100.0, "zap", allowed=False, shared=True)
+    end = type_word(recorder, 101.0, "zap")
+    recorder.delivery(end, "Main", counted=False)
+    # Pattern steps took the rest of the budget on another thread
+    type_word(recorder, 102.0, "zap", allowed=False)
+    recorder.stop()
+
+    kinds = [(kind, fields) for kind, _, fields in read_trace(path) if kind in (TRACE_OUTCOME, TRACE_DELIVERY)]
+    assert kinds[0] == (TRACE_OUTCOME, ("Main", False, True))
+    assert (TRACE_DELIVERY, ("Main", False)) in kinds
+
+    totals, output = replay(path)
+    assert totals["diverged"] == 0, output
+    assert "Pattern started" in output
+
+
+def test_overridden_limits_simulate_every_allowed_match(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 0, 5, ["zap"])])
+    for second in range(3):
+        type_word(recorder, 100.0 + second, "zap")
+    recorder.stop()
+
+    totals, _ = replay(path, cooldown=5)
+    assert (totals["allowed"], totals["denied"]) == (1, 2)
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 5, 3, ["Zap"]), ("Partner", 0, 2, ["ouch"])])
+    recorder.key(10.0, "x")
+    type_word(recorder, 10.5, "zap")
+    recorder.stop()
+    # A second session is appended to the same file
+    recorder.start([("Main", 5, 3, ["zap"])])
+    recorder.key(20.0, "z")
+    recorder.stop()
+
+    records = list(read_trace(path))
+    kinds = [kind for kind, _, _ in records]
+    assert kinds == [0, 1, 1, 1, 1, 3, 4, 0, 1]
+    started, redacted, profiles = records[0][2]
+    assert redacted and profiles == [("Main", 5, 3, ["zap"]), ("Partner", 0, 2, ["ouch"])]
+    # Characters outside every trigger word are redacted; timings are kept
+    assert records[1][2] == ("\x00",)
+    assert [round(offset, 3) for _, offset, _ in records[1:5]] == [0.0, 0.5, 0.6, 0.7]
+    assert records[5][2] == ("Main", "zap")
+
+    totals, output = replay(path)
+    assert totals == {"keys": 5, "allowed": 1, "denied": 0, "diverged": 0}, output
+    assert output.count("# Session") == 2
+
+
+def test_truncated_tail_is_ignored_and_garbage_rejected(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 5, 3, ["zap"])])
+    type_word(recorder, 1.0, "zap")
+    recorder.stop()
+    data = path.read_bytes()
+
+    path.write_bytes(data[:-1])
+    assert len(list(read_trace(path))) == 5
+
+    path.write_bytes(b"not a trace")
+    with pytest.raises(ValueError):
+        list(read_trace(path))
+
+
+def test_corrupt_record_names_its_position(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 5, 3, ["zap"])])
+    recorder.stop()
+    size = path.stat().st_size
+    with open(path, 'ab') as f:
+        f.write(b"\x00")  # A record with no kind byte
+        f.write(b"\x02\x01\x00")
+
+    records = read_trace(path)
+    assert next(records)[0] == 0
+    with pytest.raises(ValueError, match=f"corrupt trace record at byte {size}"):
+        next(records)
+
+
+def test_unknown_profile_is_a_value_error(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(path)
+    recorder.start([("Main", 5, 3, ["zap"])])
+    recorder.delivery(1.0, "Ghost")
+    recorder.stop()
+
+    with pytest.raises(ValueError, match="profile 'Ghost'"):
+        replay(path)